@@ -102,6 +102,11 @@ const embeddingModels = [
     name: "amazon.titan-embed-text-v1",
     dimensions: 1536,
   },
+  {
+    provider: "bedrock",
+    name: "amazon.titan-embed-text-v2:0",
+    dimensions: 1024,
+  },
   //Support for inputImage is not yet implemented for amazon.titan-embed-image-v1
   {
     provider: "bedrock",
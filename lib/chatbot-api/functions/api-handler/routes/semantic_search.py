@@ -1,4 +1,7 @@
+import genai_core.types
 import genai_core.semantic_search
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler.appsync import Router
@@ -8,9 +11,22 @@ router = Router()
 logger = Logger()
 
 
+class SemanticSearchFiltersRequest(BaseModel):
+    documentTypes: Optional[List[str]] = None
+    documentIds: Optional[List[str]] = None
+    pathPrefix: Optional[str] = None
+    createdAfter: Optional[datetime] = None
+    createdBefore: Optional[datetime] = None
+
+
 class SemanticSearchRequest(BaseModel):
     workspaceId: str
     query: str
+    vectorSearchK: Optional[int] = None
+    vectorSearchProbes: Optional[int] = None
+    vectorSearchEfSearch: Optional[int] = None
+    rerankCandidates: Optional[int] = None
+    filters: Optional[SemanticSearchFiltersRequest] = None
 
 
 @router.resolver(field_name="performSemanticSearch")
@@ -22,11 +38,42 @@ def semantic_search(input: dict):
             "Query must be between 1 and 1000 characters"
         )
 
+    if request.vectorSearchK is not None and (
+        request.vectorSearchK < 1 or request.vectorSearchK > 100
+    ):
+        raise genai_core.types.CommonError("Invalid vector search k")
+
+    for value in [request.vectorSearchProbes, request.vectorSearchEfSearch]:
+        if value is not None and (value < 1 or value > 1000):
+            raise genai_core.types.CommonError("Invalid vector search parameters")
+
+    if request.rerankCandidates is not None and (
+        request.rerankCandidates < 1 or request.rerankCandidates > 200
+    ):
+        raise genai_core.types.CommonError("Invalid rerank candidates")
+
+    filters = None
+    if request.filters is not None:
+        filters = {
+            "document_types": request.filters.documentTypes,
+            "document_ids": request.filters.documentIds,
+            "path_prefix": request.filters.pathPrefix,
+            "created_after": request.filters.createdAfter,
+            "created_before": request.filters.createdBefore,
+        }
+
     result = genai_core.semantic_search.semantic_search(
         workspace_id=request.workspaceId,
         query=request.query,
         limit=25,
         full_response=True,
+        vector_search_params={
+            "k": request.vectorSearchK,
+            "probes": request.vectorSearchProbes,
+            "ef_search": request.vectorSearchEfSearch,
+            "rerank_candidates": request.rerankCandidates,
+        },
+        filters=filters,
     )
     result = _convert_semantic_search_result(request.workspaceId, result)
 
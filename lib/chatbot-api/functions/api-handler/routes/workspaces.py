@@ -1,8 +1,11 @@
 import re
+from typing import Optional
 import genai_core.types
 import genai_core.kendra
 import genai_core.parameters
+import genai_core.tokenizers
 import genai_core.workspaces
+import genai_core.embeddings_batching
 from pydantic import BaseModel
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler.appsync import Router
@@ -12,6 +15,8 @@ router = Router()
 logger = Logger()
 
 name_regex = re.compile(r"^[\w+_-]+$")
+# Token chunk sizes, the maximum applies to models without a known limit
+TOKEN_CHUNK_SIZE_MIN = 25
 
 
 class GenericCreateWorkspaceRequest(BaseModel):
@@ -32,6 +37,15 @@ class CreateWorkspaceAuroraRequest(BaseModel):
     chunkingStrategy: str
     chunkSize: int
     chunkOverlap: int
+    quantization: Optional[str] = "none"
+    embeddingsModelDimensions: Optional[int] = None
+    indexType: Optional[str] = "ivfflat"
+    hnswM: Optional[int] = None
+    hnswEfConstruction: Optional[int] = None
+    vectorSearchK: Optional[int] = None
+    vectorSearchProbes: Optional[int] = None
+    vectorSearchEfSearch: Optional[int] = None
+    storageLayout: Optional[str] = None
 
 
 class CreateWorkspaceOpenSearchRequest(BaseModel):
@@ -46,6 +60,10 @@ class CreateWorkspaceOpenSearchRequest(BaseModel):
     chunkingStrategy: str
     chunkSize: int
     chunkOverlap: int
+    quantization: Optional[str] = "none"
+    embeddingsModelDimensions: Optional[int] = None
+    vectorSearchK: Optional[int] = None
+    vectorSearchEfSearch: Optional[int] = None
 
 
 class CreateWorkspaceKendraRequest(BaseModel):
@@ -144,7 +162,9 @@ def _create_workspace_aurora(request: CreateWorkspaceAuroraRequest, config: dict
     if cross_encoder_model is None:
         raise genai_core.types.CommonError("Cross encoder model not found")
 
-    embeddings_model_dimensions = embeddings_model["dimensions"]
+    embeddings_model_dimensions = _get_embeddings_model_dimensions(
+        request.embeddingsModelDimensions, embeddings_model
+    )
 
     workspace_name_match = name_regex.match(workspace_name)
     workspace_name_is_match = bool(workspace_name_match)
@@ -161,14 +181,44 @@ def _create_workspace_aurora(request: CreateWorkspaceAuroraRequest, config: dict
     if request.metric not in ["inner", "cosine", "l2"]:
         raise genai_core.types.CommonError("Invalid metric")
 
-    if request.chunkingStrategy not in ["recursive"]:
-        raise genai_core.types.CommonError("Invalid chunking strategy")
+    _check_chunking(
+        request.chunkingStrategy,
+        request.chunkSize,
+        request.chunkOverlap,
+        embeddings_model,
+    )
 
-    if request.chunkSize < 100 or request.chunkSize > 10000:
-        raise genai_core.types.CommonError("Invalid chunk size")
+    quantization = request.quantization or "none"
+    if quantization not in genai_core.workspaces.AURORA_QUANTIZATIONS:
+        raise genai_core.types.CommonError("Invalid quantization")
 
-    if request.chunkOverlap < 0 or request.chunkOverlap >= request.chunkSize:
-        raise genai_core.types.CommonError("Invalid chunk overlap")
+    index_type = request.indexType or "ivfflat"
+    if index_type not in genai_core.workspaces.AURORA_INDEX_TYPES:
+        raise genai_core.types.CommonError("Invalid index type")
+
+    hnsw_m = None
+    hnsw_ef_construction = None
+    if index_type == "hnsw":
+        hnsw_m = request.hnswM or 16
+        hnsw_ef_construction = request.hnswEfConstruction or 64
+
+        # pgvector limits, ef_construction must be at least twice m
+        if hnsw_m < 2 or hnsw_m > 100:
+            raise genai_core.types.CommonError("Invalid HNSW m")
+
+        if hnsw_ef_construction < 2 * hnsw_m or hnsw_ef_construction > 1000:
+            raise genai_core.types.CommonError("Invalid HNSW ef_construction")
+
+    vector_search_params = _get_vector_search_params(
+        request.vectorSearchK, request.vectorSearchProbes, request.vectorSearchEfSearch
+    )
+
+    storage_layout = request.storageLayout
+    if (
+        storage_layout is not None
+        and storage_layout not in genai_core.workspaces.AURORA_STORAGE_LAYOUTS
+    ):
+        raise genai_core.types.CommonError("Invalid storage layout")
 
     return _convert_workspace(
         genai_core.workspaces.create_workspace_aurora(
@@ -185,6 +235,12 @@ def _create_workspace_aurora(request: CreateWorkspaceAuroraRequest, config: dict
             chunking_strategy=request.chunkingStrategy,
             chunk_size=request.chunkSize,
             chunk_overlap=request.chunkOverlap,
+            quantization=quantization,
+            index_type=index_type,
+            hnsw_m=hnsw_m,
+            hnsw_ef_construction=hnsw_ef_construction,
+            vector_search_params=vector_search_params,
+            storage_layout=storage_layout,
         )
     )
 
@@ -220,7 +276,9 @@ def _create_workspace_open_search(
     if cross_encoder_model is None:
         raise genai_core.types.CommonError("Cross encoder model not found")
 
-    embeddings_model_dimensions = embeddings_model["dimensions"]
+    embeddings_model_dimensions = _get_embeddings_model_dimensions(
+        request.embeddingsModelDimensions, embeddings_model
+    )
 
     workspace_name_match = name_regex.match(workspace_name)
     workspace_name_is_match = bool(workspace_name_match)
@@ -234,14 +292,20 @@ def _create_workspace_open_search(
     if len(request.languages) == 0 or len(request.languages) > 3:
         raise genai_core.types.CommonError("Invalid languages")
 
-    if request.chunkingStrategy not in ["recursive"]:
-        raise genai_core.types.CommonError("Invalid chunking strategy")
+    _check_chunking(
+        request.chunkingStrategy,
+        request.chunkSize,
+        request.chunkOverlap,
+        embeddings_model,
+    )
 
-    if request.chunkSize < 100 or request.chunkSize > 10000:
-        raise genai_core.types.CommonError("Invalid chunk size")
+    quantization = request.quantization or "none"
+    if quantization not in genai_core.workspaces.OPEN_SEARCH_QUANTIZATION_ENGINES:
+        raise genai_core.types.CommonError("Invalid quantization")
 
-    if request.chunkOverlap < 0 or request.chunkOverlap >= request.chunkSize:
-        raise genai_core.types.CommonError("Invalid chunk overlap")
+    vector_search_params = _get_vector_search_params(
+        request.vectorSearchK, None, request.vectorSearchEfSearch
+    )
 
     return _convert_workspace(
         genai_core.workspaces.create_workspace_open_search(
@@ -256,6 +320,8 @@ def _create_workspace_open_search(
             chunking_strategy=request.chunkingStrategy,
             chunk_size=request.chunkSize,
             chunk_overlap=request.chunkOverlap,
+            quantization=quantization,
+            vector_search_params=vector_search_params,
         )
     )
 
@@ -291,8 +357,70 @@ def _create_workspace_kendra(request: CreateWorkspaceKendraRequest, config: dict
     )
 
 
+def _get_embeddings_model_dimensions(
+    requested_dimensions: Optional[int], embeddings_model: dict
+):
+    model_dimensions = embeddings_model["dimensions"]
+    if requested_dimensions is None:
+        return model_dimensions
+
+    # Embeddings are truncated to the leading dimensions, this keeps
+    # most of the quality for models trained with Matryoshka losses
+    if requested_dimensions < 32 or requested_dimensions > model_dimensions:
+        raise genai_core.types.CommonError("Invalid embeddings model dimensions")
+
+    return requested_dimensions
+
+
+def _check_chunking(
+    chunking_strategy: str, chunk_size: int, chunk_overlap: int, embeddings_model: dict
+):
+    if chunking_strategy == "recursive":
+        min_size, max_size = 100, 10000
+    elif chunking_strategy == "token":
+        # Token chunks are embedded whole, above this size the end of
+        # every chunk would be truncated
+        model = genai_core.types.EmbeddingsModel(**embeddings_model)
+        min_size = TOKEN_CHUNK_SIZE_MIN
+        max_size = genai_core.embeddings_batching.get_max_chunk_tokens(model)
+
+        if genai_core.tokenizers.is_token_count_estimated(model.provider):
+            logger.warning(
+                f"No public tokenizer for {model.provider}/{model.name}, "
+                "token counts are estimated from the text length"
+            )
+    else:
+        raise genai_core.types.CommonError("Invalid chunking strategy")
+
+    if chunk_size < min_size or chunk_size > max_size:
+        raise genai_core.types.CommonError(
+            f"Invalid chunk size, it must be between {min_size} and {max_size}"
+        )
+
+    if chunk_overlap < 0 or chunk_overlap >= chunk_size:
+        raise genai_core.types.CommonError("Invalid chunk overlap")
+
+
+def _get_vector_search_params(
+    k: Optional[int], probes: Optional[int], ef_search: Optional[int]
+):
+    if k is not None and (k < 1 or k > 100):
+        raise genai_core.types.CommonError("Invalid vector search k")
+
+    if probes is not None and (probes < 1 or probes > 1000):
+        raise genai_core.types.CommonError("Invalid vector search probes")
+
+    if ef_search is not None and (ef_search < 1 or ef_search > 1000):
+        raise genai_core.types.CommonError("Invalid vector search ef_search")
+
+    params = {"k": k, "probes": probes, "ef_search": ef_search}
+
+    return {key: value for key, value in params.items() if value is not None}
+
+
 def _convert_workspace(workspace: dict):
     kendra_index_external = workspace.get("kendra_index_external")
+    vector_search_params = workspace.get("vector_search_params") or {}
 
     return {
         "id": workspace["workspace_id"],
@@ -311,6 +439,14 @@ def _convert_workspace(workspace: dict):
         "chunkingStrategy": workspace.get("chunking_strategy"),
         "chunkSize": workspace.get("chunk_size"),
         "chunkOverlap": workspace.get("chunk_overlap"),
+        "quantization": workspace.get("quantization"),
+        "indexType": workspace.get("index_type"),
+        "hnswM": workspace.get("hnsw_m"),
+        "hnswEfConstruction": workspace.get("hnsw_ef_construction"),
+        "storageLayout": workspace.get("storage_layout"),
+        "vectorSearchK": vector_search_params.get("k"),
+        "vectorSearchProbes": vector_search_params.get("probes"),
+        "vectorSearchEfSearch": vector_search_params.get("ef_search"),
         "vectors": workspace.get("vectors", 0),
         "documents": workspace.get("documents", 0),
         "aossEngine": workspace.get("aoss_engine"),
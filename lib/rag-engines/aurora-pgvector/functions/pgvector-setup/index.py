@@ -35,6 +35,8 @@ def lambda_handler(event, context: LambdaContext):
         cur = dbconn.cursor()
 
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        # Newer versions add halfvec and binary_quantize used by quantized workspaces
+        cur.execute("ALTER EXTENSION vector UPDATE;")
         register_vector(dbconn)
 
         cur.execute("SELECT typname FROM pg_type WHERE typname = 'vector';")
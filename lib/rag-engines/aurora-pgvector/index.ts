@@ -26,9 +26,11 @@ export class AuroraPgVector extends Construct {
   constructor(scope: Construct, id: string, props: AuroraPgVectorProps) {
     super(scope, id);
 
+    // 15.5 ships pgvector 0.5, the first version with HNSW indexes
+    const engineVersion = rds.AuroraPostgresEngineVersion.VER_15_5;
     const dbCluster = new rds.DatabaseCluster(this, "AuroraDatabase", {
       engine: rds.DatabaseClusterEngine.auroraPostgres({
-        version: rds.AuroraPostgresEngineVersion.VER_15_3,
+        version: engineVersion,
       }),
       removalPolicy: cdk.RemovalPolicy.DESTROY,
       writer: rds.ClusterInstance.serverlessV2("ServerlessInstance"),
@@ -77,6 +79,8 @@ export class AuroraPgVector extends Construct {
         serviceToken: databaseSetupProvider.serviceToken,
         properties: {
           AURORA_DB_SECRET_ID: dbCluster.secret?.secretArn as string,
+          // Runs the setup again after an upgrade to update the extension
+          AURORA_ENGINE_VERSION: engineVersion.auroraPostgresFullVersion,
         },
       }
     );
@@ -91,6 +91,15 @@ export class KendraRetrieval extends Construct {
               searchable: true,
             },
           },
+          {
+            name: "document_id",
+            type: "STRING_VALUE",
+            search: {
+              displayable: true,
+              facetable: true,
+              searchable: true,
+            },
+          },
         ],
       });
 
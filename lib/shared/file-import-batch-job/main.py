@@ -1,10 +1,13 @@
 import os
+import codecs
 import boto3
 import genai_core.types
 import genai_core.chunks
 import genai_core.documents
 import genai_core.workspaces
 import genai_core.aurora.create
+import genai_core.aurora.indexes
+from typing import Iterable
 from langchain.document_loaders import S3FileLoader
 
 WORKSPACE_ID = os.environ.get("WORKSPACE_ID")
@@ -39,43 +42,84 @@ def main():
     try:
         extension = os.path.splitext(INPUT_OBJECT_KEY)[-1].lower()
         if extension == ".txt":
+            if (
+                INPUT_BUCKET_NAME != PROCESSING_BUCKET_NAME
+                and INPUT_OBJECT_KEY != PROCESSING_OBJECT_KEY
+            ):
+                s3_client.copy_object(
+                    Bucket=PROCESSING_BUCKET_NAME,
+                    Key=PROCESSING_OBJECT_KEY,
+                    CopySource={"Bucket": INPUT_BUCKET_NAME, "Key": INPUT_OBJECT_KEY},
+                )
+
+            # Stream plain text files, the document is never fully in memory
             object = s3_client.get_object(
                 Bucket=INPUT_BUCKET_NAME, Key=INPUT_OBJECT_KEY
             )
-            content = object["Body"].read().decode("utf-8")
+            add_chunks(workspace, document, _read_text(object["Body"]))
         else:
             loader = S3FileLoader(INPUT_BUCKET_NAME, INPUT_OBJECT_KEY)
             print(f"loader: {loader}")
             docs = loader.load()
             content = docs[0].page_content
 
-        if (
-            INPUT_BUCKET_NAME != PROCESSING_BUCKET_NAME
-            and INPUT_OBJECT_KEY != PROCESSING_OBJECT_KEY
-        ):
-            s3_client.put_object(
-                Bucket=PROCESSING_BUCKET_NAME, Key=PROCESSING_OBJECT_KEY, Body=content
-            )
+            if (
+                INPUT_BUCKET_NAME != PROCESSING_BUCKET_NAME
+                and INPUT_OBJECT_KEY != PROCESSING_OBJECT_KEY
+            ):
+                s3_client.put_object(
+                    Bucket=PROCESSING_BUCKET_NAME,
+                    Key=PROCESSING_OBJECT_KEY,
+                    Body=content,
+                )
 
-        add_chunks(workspace, document, content)
+            add_chunks(workspace, document, [content])
     except Exception as error:
         genai_core.documents.set_status(WORKSPACE_ID, DOCUMENT_ID, "error")
         print(error)
         raise error
 
+    if workspace["engine"] == "aurora":
+        ensure_workspace_index(workspace)
+
+
+def ensure_workspace_index(workspace: dict):
+    # The document is imported and searchable, a failed index build is
+    # retried by the next import of the workspace
+    try:
+        genai_core.aurora.indexes.ensure_workspace_index(workspace)
+    except Exception as error:
+        print(f"Vector index build failed: {error}")
+
 
-def add_chunks(workspace: dict, document: dict, content: str):
-    chunks = genai_core.chunks.split_content(workspace, content)
+def add_chunks(workspace: dict, document: dict, content: Iterable[str]):
+    chunks = genai_core.chunks.split_content_stream(workspace, content)
 
-    genai_core.chunks.add_chunks(
+    genai_core.chunks.add_chunks_stream(
         workspace=workspace,
         document=document,
         document_sub_id=None,
         chunks=chunks,
-        chunk_complements=None,
         replace=True,
     )
 
 
+def _read_text(body, read_size: int = genai_core.chunks.STREAM_READ_SIZE):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    while True:
+        data = body.read(read_size)
+        if not data:
+            break
+
+        text = decoder.decode(data)
+        if text:
+            yield text
+
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,52 @@
+import random
+from typing import List
+
+VOCABULARY_SIZE = 5000
+
+
+def build_vocabulary(seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+
+    vocabulary = set()
+    while len(vocabulary) < VOCABULARY_SIZE:
+        length = rng.randint(3, 10)
+        vocabulary.add("".join(rng.choice(letters) for _ in range(length)))
+
+    return sorted(vocabulary)
+
+
+def generate_documents(count: int, words_per_document: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(seed)
+
+    documents = []
+    for _ in range(count):
+        # Every document leans on its own topic words so queries have
+        # something to find
+        topic = rng.sample(vocabulary, 20)
+        words = []
+        for _ in range(words_per_document):
+            if rng.random() < 0.3:
+                words.append(rng.choice(topic))
+            else:
+                words.append(rng.choice(vocabulary))
+
+            if rng.random() < 0.08:
+                words[-1] = words[-1] + "."
+
+        documents.append(" ".join(words))
+
+    return documents
+
+
+def generate_queries(documents: List[str], count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed + 1)
+
+    queries = []
+    for _ in range(count):
+        words = rng.choice(documents).split()
+        start = rng.randint(0, max(0, len(words) - 8))
+        queries.append(" ".join(words[start : start + 8]).replace(".", ""))
+
+    return queries
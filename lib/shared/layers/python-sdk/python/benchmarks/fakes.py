@@ -0,0 +1,235 @@
+import io
+import json
+import time
+import random
+import hashlib
+import threading
+import botocore
+import numpy as np
+from typing import Dict, List, Optional
+
+
+class RequestStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.texts = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def add(self, texts: int = 0, throttled: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.texts += texts
+            if throttled:
+                self.throttled += 1
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "throttled": self.throttled,
+        }
+
+
+class FakeEndpoint(object):
+    """
+    Deterministic stand-in for a model endpoint with a configurable
+    latency and a throttling rate.
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        latency: float = 0.0,
+        latency_per_text: float = 0.0,
+        jitter: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.stats = RequestStats()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._token_vectors: Dict[str, np.ndarray] = {}
+        self._token_lock = threading.Lock()
+
+    def embed(self, text: str) -> List[float]:
+        # Bag of hashed token vectors, texts sharing words end up close
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in _tokenize(text):
+            vector += self._get_token_vector(token)
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+
+        return vector.tolist()
+
+    def score(self, query: str, passage: str) -> float:
+        query_tokens = set(_tokenize(query))
+        if not query_tokens:
+            return 0.0
+
+        passage_tokens = set(_tokenize(passage))
+        overlap = len(query_tokens & passage_tokens) / len(query_tokens)
+
+        return overlap * 10 - 5
+
+    def simulate(self, operation: str, texts: int):
+        with self._random_lock:
+            throttled = self._random.random() < self.throttle_rate
+            jitter = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+
+        self.stats.add(texts=texts, throttled=throttled)
+        time.sleep(self.latency + self.latency_per_text * texts + jitter)
+
+        if throttled:
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+                operation,
+            )
+
+    def _get_token_vector(self, token: str) -> np.ndarray:
+        with self._token_lock:
+            vector = self._token_vectors.get(token)
+            if vector is None:
+                seed = int(hashlib.sha256(token.encode("utf-8")).hexdigest()[:8], 16)
+                rng = np.random.default_rng(seed)
+                vector = rng.standard_normal(self.dimensions).astype(np.float32)
+                self._token_vectors[token] = vector
+
+        return vector
+
+
+class FakeBedrockRuntime(object):
+    def __init__(self, endpoint: FakeEndpoint):
+        self.endpoint = endpoint
+
+    def invoke_model(self, body: str, modelId: str, accept: str, contentType: str):
+        request = json.loads(body)
+
+        if "inputText" in request:
+            self.endpoint.simulate("InvokeModel", 1)
+            response = {"embedding": self.endpoint.embed(request["inputText"])}
+        else:
+            texts = request["texts"]
+            self.endpoint.simulate("InvokeModel", len(texts))
+            response = {"embeddings": [self.endpoint.embed(text) for text in texts]}
+
+        return {"body": io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+
+class FakeSageMakerRuntime(object):
+    def __init__(self, embeddings: FakeEndpoint, cross_encoder: FakeEndpoint):
+        self.embeddings = embeddings
+        self.cross_encoder = cross_encoder
+
+    def invoke_endpoint(self, EndpointName: str, ContentType: str, Body: str):
+        request = json.loads(Body)
+
+        if request["type"] == "embeddings":
+            texts = request["input"]
+            self.embeddings.simulate("InvokeEndpoint", len(texts))
+            response = [self.embeddings.embed(text) for text in texts]
+        elif request["type"] == "cross-encoder":
+            passages = request["passages"]
+            self.cross_encoder.simulate("InvokeEndpoint", len(passages))
+            response = [
+                self.cross_encoder.score(request["input"], passage)
+                for passage in passages
+            ]
+        else:
+            raise ValueError(f"Unknown request type {request['type']}")
+
+        return {"Body": io.BytesIO(json.dumps(response).encode("utf-8"))}
+
+
+class InMemoryVectorStore(object):
+    """
+    Brute force vector store used in place of Aurora and OpenSearch.
+    """
+
+    def __init__(self):
+        self.rows: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+
+    def add_chunks(
+        self,
+        workspace_id: str,
+        document_id: str,
+        chunk_ids: List[str],
+        chunk_embeddings,
+        chunks: List[str],
+        replace: bool,
+        chunk_hashes: Optional[List[str]] = None,
+        removed_chunk_ids: Optional[List[str]] = None,
+        **kwargs,
+    ):
+        removed_vectors = 0
+        if removed_chunk_ids is not None:
+            removed_vectors = self.remove_chunks(workspace_id, removed_chunk_ids)
+
+        with self._lock:
+            rows = self.rows.setdefault(workspace_id, [])
+            if replace:
+                kept = [row for row in rows if row["document_id"] != document_id]
+                removed_vectors = len(rows) - len(kept)
+                rows[:] = kept
+
+            for idx, chunk_id in enumerate(chunk_ids):
+                rows.append(
+                    {
+                        "chunk_id": str(chunk_id),
+                        "workspace_id": workspace_id,
+                        "document_id": document_id,
+                        "content": chunks[idx],
+                        "content_hash": chunk_hashes[idx] if chunk_hashes else None,
+                        "content_embeddings": np.asarray(
+                            chunk_embeddings[idx], dtype=np.float32
+                        ),
+                    }
+                )
+
+        return {"removed_vectors": removed_vectors, "added_vectors": len(chunk_ids)}
+
+    def get_chunk_hashes(self, workspace_id: str, document_id: str):
+        ret_value = {}
+        with self._lock:
+            for row in self.rows.get(workspace_id, []):
+                if row["document_id"] == document_id:
+                    ret_value.setdefault(row["content_hash"], []).append(
+                        row["chunk_id"]
+                    )
+
+        return ret_value
+
+    def remove_chunks(self, workspace_id: str, chunk_ids: List[str]):
+        chunk_ids = set(str(chunk_id) for chunk_id in chunk_ids)
+        with self._lock:
+            rows = self.rows.setdefault(workspace_id, [])
+            kept = [row for row in rows if row["chunk_id"] not in chunk_ids]
+            removed_vectors = len(rows) - len(kept)
+            rows[:] = kept
+
+        return removed_vectors
+
+    def search(self, workspace_id: str, vector, size: int):
+        with self._lock:
+            rows = list(self.rows.get(workspace_id, []))
+
+        if not rows:
+            return []
+
+        matrix = np.stack([row["content_embeddings"] for row in rows])
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)[:size]
+
+        return [(rows[idx], float(scores[idx])) for idx in order]
+
+
+def _tokenize(text: str) -> List[str]:
+    return [token for token in text.lower().split() if token]
@@ -0,0 +1,345 @@
+"""
+Offline micro-benchmark of the genai_core model calls: chunking, the
+ingestion pipeline, embeddings requests and cross-encoder reranking.
+
+Model endpoints, storage engines and AWS services are replaced by
+deterministic in-process fakes, so the benchmark runs without network
+access or AWS credentials. Engine queries are replaced by an exact
+search over an in-memory store: the Aurora and OpenSearch query paths
+are not exercised and their latency is not part of the results.
+
+    cd lib/shared/layers/python-sdk/python
+    python -m benchmarks.run --provider bedrock-titan --latency-ms 40
+"""
+
+import os
+
+# genai_core reads its configuration and creates its boto3 clients at import
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+os.environ.setdefault("SAGEMAKER_RAG_MODELS_ENDPOINT", "benchmark")
+os.environ.setdefault("PROCESSING_BUCKET_NAME", "benchmark")
+os.environ.setdefault("UPLOAD_BUCKET_NAME", "benchmark")
+os.environ.setdefault("WORKSPACES_TABLE_NAME", "benchmark")
+os.environ.setdefault("DOCUMENTS_TABLE_NAME", "benchmark")
+os.environ.setdefault("EMBEDDINGS_CACHE", "none")
+
+import json
+import time
+import uuid
+import argparse
+import numpy as np
+import genai_core.chunks
+import genai_core.clients
+import genai_core.documents
+import genai_core.embeddings
+import genai_core.embeddings_cache
+import genai_core.cross_encoder
+import genai_core.parameters
+import genai_core.workspaces
+import genai_core.semantic_search
+import genai_core.aurora.chunks
+import genai_core.opensearch.chunks
+from typing import List, Optional
+from genai_core.types import Task
+from benchmarks.corpus import generate_documents, generate_queries
+from benchmarks.fakes import (
+    FakeEndpoint,
+    FakeBedrockRuntime,
+    FakeSageMakerRuntime,
+    InMemoryVectorStore,
+)
+
+PROVIDERS = {
+    "bedrock-titan": ("bedrock", "amazon.titan-embed-text-v1", 1536),
+    "bedrock-cohere": ("bedrock", "cohere.embed-multilingual-v3", 1024),
+    "sagemaker": ("sagemaker", "intfloat/multilingual-e5-large", 1024),
+}
+CROSS_ENCODER = ("sagemaker", "cross-encoder/ms-marco-MiniLM-L-12-v2")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="genai_core model calls benchmark")
+    parser.add_argument("--provider", choices=PROVIDERS.keys(), default="sagemaker")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--words-per-document", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-per-text-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--cross-encoder-latency-ms", type=float, default=30.0)
+    parser.add_argument("--cache", default="none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the raw report")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+def run_benchmark(args):
+    provider, model_name, dimensions = PROVIDERS[args.provider]
+    embeddings_endpoint = FakeEndpoint(
+        dimensions,
+        latency=args.latency_ms / 1000,
+        latency_per_text=args.latency_per_text_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        throttle_rate=args.throttle_rate,
+        seed=args.seed,
+    )
+    cross_encoder_endpoint = FakeEndpoint(
+        dimensions,
+        latency=args.cross_encoder_latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        seed=args.seed,
+    )
+    store = InMemoryVectorStore()
+    workspace = _create_workspace(args, provider, model_name, dimensions)
+
+    _install_fakes(
+        workspace,
+        store,
+        embeddings_endpoint,
+        cross_encoder_endpoint,
+        provider,
+        model_name,
+        dimensions,
+        args.cache,
+    )
+
+    documents = generate_documents(args.documents, args.words_per_document, args.seed)
+    queries = generate_queries(documents, args.queries, args.seed)
+
+    ingestion_latencies = []
+    chunk_count = 0
+    ingestion_start = time.perf_counter()
+    for content in documents:
+        document = {
+            "document_id": str(uuid.uuid4()),
+            "document_type": "text",
+            "document_sub_type": None,
+            "path": "benchmark.txt",
+            "title": "benchmark",
+        }
+
+        start = time.perf_counter()
+        chunks = genai_core.chunks.split_content(workspace, content)
+        genai_core.chunks.add_chunks(
+            workspace=workspace,
+            document=document,
+            document_sub_id=None,
+            chunks=chunks,
+            chunk_complements=None,
+            replace=True,
+        )
+        ingestion_latencies.append(time.perf_counter() - start)
+        chunk_count += len(chunks)
+    ingestion_time = time.perf_counter() - ingestion_start
+    ingestion_stats = embeddings_endpoint.stats.to_dict()
+
+    query_latencies = []
+    query_start = time.perf_counter()
+    for query in queries:
+        start = time.perf_counter()
+        genai_core.semantic_search.semantic_search(
+            workspace["workspace_id"], query, limit=5, full_response=False
+        )
+        query_latencies.append(time.perf_counter() - start)
+    query_time = time.perf_counter() - query_start
+
+    embeddings_stats = embeddings_endpoint.stats.to_dict()
+    query_embeddings_stats = {
+        key: embeddings_stats[key] - ingestion_stats[key] for key in embeddings_stats
+    }
+
+    return {
+        "provider": args.provider,
+        "ingestion": {
+            "documents": len(documents),
+            "chunks": chunk_count,
+            "seconds": ingestion_time,
+            "documents_per_second": len(documents) / ingestion_time,
+            "chunks_per_second": chunk_count / ingestion_time,
+            "latency": _summarize(ingestion_latencies),
+            "embeddings_requests": ingestion_stats,
+        },
+        "retrieval": {
+            "queries": len(queries),
+            "seconds": query_time,
+            "queries_per_second": len(queries) / query_time if queries else 0.0,
+            "latency": _summarize(query_latencies),
+            "embeddings_requests": query_embeddings_stats,
+            "cross_encoder_requests": cross_encoder_endpoint.stats.to_dict(),
+        },
+        "embeddings_cache": genai_core.embeddings_cache.get_embeddings_cache().get_stats(),
+    }
+
+
+def print_report(report: dict):
+    ingestion = report["ingestion"]
+    retrieval = report["retrieval"]
+
+    print(f"Provider: {report['provider']}")
+    print(
+        f"Ingestion: {ingestion['documents']} documents, {ingestion['chunks']} chunks "
+        f"in {ingestion['seconds']:.2f}s "
+        f"({ingestion['documents_per_second']:.2f} docs/s, "
+        f"{ingestion['chunks_per_second']:.1f} chunks/s)"
+    )
+    print(f"  latency per document: {_format_latency(ingestion['latency'])}")
+    print(f"  embeddings requests: {ingestion['embeddings_requests']}")
+    print(
+        f"Retrieval (in-memory search): {retrieval['queries']} queries "
+        f"in {retrieval['seconds']:.2f}s "
+        f"({retrieval['queries_per_second']:.2f} queries/s)"
+    )
+    print(f"  latency per query: {_format_latency(retrieval['latency'])}")
+    print(f"  embeddings requests: {retrieval['embeddings_requests']}")
+    print(f"  cross-encoder requests: {retrieval['cross_encoder_requests']}")
+    print(f"Embeddings cache: {report['embeddings_cache']}")
+
+
+def _create_workspace(args, provider: str, model_name: str, dimensions: int):
+    return {
+        "workspace_id": str(uuid.uuid4()),
+        "name": "benchmark",
+        "engine": "aurora",
+        "status": "ready",
+        "embeddings_model_provider": provider,
+        "embeddings_model_name": model_name,
+        "embeddings_model_dimensions": dimensions,
+        "cross_encoder_model_provider": CROSS_ENCODER[0],
+        "cross_encoder_model_name": CROSS_ENCODER[1],
+        "languages": ["english"],
+        "metric": "cosine",
+        "has_index": False,
+        "hybrid_search": False,
+        "chunking_strategy": "recursive",
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+    }
+
+
+def _install_fakes(
+    workspace: dict,
+    store: InMemoryVectorStore,
+    embeddings_endpoint: FakeEndpoint,
+    cross_encoder_endpoint: FakeEndpoint,
+    provider: str,
+    model_name: str,
+    dimensions: int,
+    cache: str,
+):
+    config = {
+        "bedrock": {"enabled": True},
+        "rag": {
+            "embeddingsModels": [
+                {"provider": provider, "name": model_name, "dimensions": dimensions}
+            ],
+            "crossEncoderModels": [
+                {"provider": CROSS_ENCODER[0], "name": CROSS_ENCODER[1]}
+            ],
+        },
+    }
+
+    bedrock = FakeBedrockRuntime(embeddings_endpoint)
+    sagemaker = FakeSageMakerRuntime(embeddings_endpoint, cross_encoder_endpoint)
+
+    genai_core.parameters.get_config = lambda: config
+    genai_core.clients.get_bedrock_client = lambda *args, **kwargs: bedrock
+    genai_core.clients.get_sagemaker_client = lambda *args, **kwargs: sagemaker
+    genai_core.embeddings_cache.set_embeddings_cache(
+        genai_core.embeddings_cache.create_embeddings_cache(cache)
+    )
+
+    genai_core.workspaces.get_workspace = lambda workspace_id: workspace
+    genai_core.documents.set_document_vectors = lambda *args, **kwargs: None
+    genai_core.chunks.store_chunks_on_s3 = lambda *args, **kwargs: None
+    genai_core.aurora.chunks.add_chunks_aurora = store.add_chunks
+    genai_core.opensearch.chunks.add_chunks_open_search = store.add_chunks
+    genai_core.aurora.chunks.get_chunk_hashes_aurora = store.get_chunk_hashes
+    genai_core.opensearch.chunks.get_chunk_hashes_open_search = store.get_chunk_hashes
+    genai_core.aurora.chunks.remove_chunks_aurora = store.remove_chunks
+    genai_core.opensearch.chunks.remove_chunks_open_search = store.remove_chunks
+
+    # Stands in for the engine queries, only the model calls are measured
+    def query_in_memory(
+        workspace_id: str,
+        workspace: dict,
+        query: str,
+        limit: int,
+        full_response: bool,
+        threshold: float = 0,
+        vector_search_params: Optional[dict] = None,
+        filters=None,
+    ):
+        embeddings_model = genai_core.embeddings.get_embeddings_model(
+            workspace["embeddings_model_provider"], workspace["embeddings_model_name"]
+        )
+        cross_encoder_model = genai_core.cross_encoder.get_cross_encoder_model(
+            workspace["cross_encoder_model_provider"],
+            workspace["cross_encoder_model_name"],
+        )
+
+        query_embeddings = genai_core.embeddings.generate_embeddings(
+            embeddings_model,
+            [query],
+            Task.RETRIEVE,
+            as_array=True,
+            dimensions=workspace["embeddings_model_dimensions"],
+        )[0]
+
+        search_params = genai_core.workspaces.get_vector_search_params(
+            workspace, vector_search_params
+        )
+        candidates = store.search(workspace_id, query_embeddings, search_params.k)
+        passages = [row["content"] for row, _ in candidates]
+        scores = []
+        if passages:
+            scores = genai_core.cross_encoder.rank_passages(
+                cross_encoder_model, query, passages
+            )
+
+        items = [
+            {"chunk_id": row["chunk_id"], "score": score, "vector_search_score": vs}
+            for (row, vs), score in zip(candidates, scores)
+        ]
+        items = sorted(items, key=lambda x: x["score"], reverse=True)
+
+        return {"engine": workspace["engine"], "items": items[:limit]}
+
+    genai_core.semantic_search.query_workspace_aurora = query_in_memory
+    genai_core.semantic_search.query_workspace_open_search = query_in_memory
+
+
+def _summarize(latencies: List[float]):
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    values = np.array(latencies)
+
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def _format_latency(latency: dict):
+    return (
+        f"p50 {latency['p50'] * 1000:.1f} ms, "
+        f"p95 {latency['p95'] * 1000:.1f} ms, "
+        f"max {latency['max'] * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
+import os
+import numpy as np
+import psycopg2.extras
 from psycopg2 import sql
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 from genai_core.aurora.connection import AuroraConnection
 
+# Rows sent in a single INSERT statement
+AURORA_INSERT_BATCH_SIZE = int(os.environ.get("AURORA_INSERT_BATCH_SIZE", 500))
+# Tables known to have the content_hash column in this process
+_hashed_tables = set()
+
 
 def add_chunks_aurora(
     workspace_id: str,
@@ -12,17 +20,35 @@ def add_chunks_aurora(
     path: Optional[str],
     title: Optional[str],
     chunk_ids: List[str],
-    chunk_embeddings: List[int],
+    chunk_embeddings: Union[List[List[float]], np.ndarray],
     chunks: List[str],
     chunk_complements: List[str],
     replace: bool,
+    chunk_hashes: Optional[List[str]] = None,
+    removed_chunk_ids: Optional[List[str]] = None,
 ):
     table_name = sql.Identifier(workspace_id.replace("-", ""))
     complements_len = len(chunk_complements) if chunk_complements else 0
+    hashes_len = len(chunk_hashes) if chunk_hashes else 0
     removed_vectors = 0
 
     with AuroraConnection(autocommit=False) as cursor:
-        if replace:
+        _ensure_content_hash_column(cursor, workspace_id)
+
+        if removed_chunk_ids is not None:
+            # Incremental replace, only the chunks missing from the new
+            # content are removed
+            if removed_chunk_ids:
+                cursor.execute(
+                    sql.SQL(
+                        """DELETE FROM {table} WHERE 
+                            workspace_id = %s AND chunk_id = ANY(%s);"""
+                    ).format(table=table_name),
+                    [workspace_id, list(removed_chunk_ids)],
+                )
+
+                removed_vectors = cursor.rowcount
+        elif replace:
             cursor.execute(
                 sql.SQL(
                     """DELETE FROM {table} WHERE 
@@ -33,33 +59,16 @@ def add_chunks_aurora(
 
             removed_vectors = cursor.rowcount
 
+        rows = []
         for idx in range(len(chunk_ids)):
-            chunk_id = chunk_ids[idx]
-            content = chunks[idx]
             content_complement = (
                 chunk_complements[idx] if idx < complements_len else None
             )
+            content_hash = chunk_hashes[idx] if idx < hashes_len else None
 
-            cursor.execute(
-                sql.SQL(
-                    """INSERT INTO {table} (
-                        chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        title,
-                        content,
-                        content_complement,
-                        content_embeddings
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s
-                    );"""
-                ).format(table=table_name),
-                [
-                    chunk_id,
+            rows.append(
+                (
+                    chunk_ids[idx],
                     workspace_id,
                     document_id,
                     document_sub_id,
@@ -67,12 +76,36 @@ def add_chunks_aurora(
                     document_sub_type,
                     path,
                     title,
-                    content,
+                    chunks[idx],
                     content_complement,
+                    content_hash,
                     chunk_embeddings[idx],
-                ],
+                )
             )
 
+        # One multi-row INSERT per page instead of a round trip per chunk
+        psycopg2.extras.execute_values(
+            cursor,
+            sql.SQL(
+                """INSERT INTO {table} (
+                    chunk_id, 
+                    workspace_id,
+                    document_id, 
+                    document_sub_id, 
+                    document_type,
+                    document_sub_type,
+                    path,
+                    title,
+                    content,
+                    content_complement,
+                    content_hash,
+                    content_embeddings
+                ) VALUES %s;"""
+            ).format(table=table_name),
+            rows,
+            page_size=AURORA_INSERT_BATCH_SIZE,
+        )
+
         cursor.connection.commit()
 
     return {"removed_vectors": removed_vectors, "added_vectors": len(chunk_ids)}
@@ -88,3 +121,67 @@ def clean_chunks_aurora(workspace_id: str, document_id: str):
             ).format(table=table_name),
             [workspace_id, document_id],
         )
+
+
+# Chunks stored before content hashing are grouped under None
+def get_chunk_hashes_aurora(workspace_id: str, document_id: str) -> Dict:
+    table_name = sql.Identifier(workspace_id.replace("-", ""))
+    ret_value = {}
+
+    with AuroraConnection() as cursor:
+        _ensure_content_hash_column(cursor, workspace_id)
+
+        cursor.execute(
+            sql.SQL(
+                """SELECT chunk_id, content_hash FROM {table} WHERE 
+                    workspace_id = %s AND document_id = %s;"""
+            ).format(table=table_name),
+            [workspace_id, document_id],
+        )
+
+        for chunk_id, content_hash in cursor.fetchall():
+            ret_value.setdefault(content_hash, []).append(chunk_id)
+
+    return ret_value
+
+
+def remove_chunks_aurora(workspace_id: str, chunk_ids: List[str]):
+    table_name = sql.Identifier(workspace_id.replace("-", ""))
+    if not chunk_ids:
+        return 0
+
+    with AuroraConnection() as cursor:
+        cursor.execute(
+            sql.SQL(
+                """DELETE FROM {table} WHERE 
+                    workspace_id = %s AND chunk_id = ANY(%s);"""
+            ).format(table=table_name),
+            [workspace_id, list(chunk_ids)],
+        )
+
+        return cursor.rowcount
+
+
+# Adding a nullable column only updates the catalog, rows are not rewritten
+def _ensure_content_hash_column(cursor, workspace_id: str):
+    table = workspace_id.replace("-", "")
+    if table in _hashed_tables:
+        return
+
+    cursor.execute(
+        """SELECT 1 FROM information_schema.columns 
+            WHERE table_name = %s AND column_name = 'content_hash';""",
+        [table],
+    )
+
+    if cursor.fetchone() is None:
+        cursor.execute(
+            sql.SQL(
+                "ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);"
+            ).format(table=sql.Identifier(table))
+        )
+
+        if not cursor.connection.autocommit:
+            cursor.connection.commit()
+
+    _hashed_tables.add(table)
@@ -1,45 +1,181 @@
 import os
 import json
+import time
 import boto3
+import select
+import threading
 import psycopg2
 import psycopg2.extras
 from pgvector.psycopg2 import register_vector
 
 secretsmanager_client = boto3.client("secretsmanager")
 AURORA_DB_SECRET_ID = os.environ.get("AURORA_DB_SECRET_ID")
+# Seconds the database secret is reused before it is read again
+AURORA_SECRET_TTL = int(os.environ.get("AURORA_SECRET_TTL", 300))
+# Idle connections kept open between calls and warm invocations
+AURORA_POOL_SIZE = int(os.environ.get("AURORA_POOL_SIZE", 4))
+# Idle connections older than this are checked before they are reused
+AURORA_HEALTH_CHECK_INTERVAL = int(os.environ.get("AURORA_HEALTH_CHECK_INTERVAL", 30))
+# Aurora Serverless takes a few seconds to resume after scaling to zero
+AURORA_CONNECT_ATTEMPTS = 3
+
+psycopg2.extras.register_uuid()
 
 
 class AuroraConnection(object):
     def __init__(self, autocommit=True):
-        secret_response = secretsmanager_client.get_secret_value(
-            SecretId=AURORA_DB_SECRET_ID
-        )
-        database_secrets = json.loads(secret_response["SecretString"])
         self.autocommit = autocommit
 
-        self.dbhost = database_secrets["host"]
-        self.dbport = database_secrets["port"]
-        self.dbuser = database_secrets["username"]
-        self.dbpass = database_secrets["password"]
-
     def __enter__(self):
-        connection = psycopg2.connect(
-            host=self.dbhost,
-            user=self.dbuser,
-            password=self.dbpass,
-            port=self.dbport,
-            connect_timeout=10,
-        )
+        connection = pool.acquire()
+        try:
+            connection.autocommit = self.autocommit
+            cursor = connection.cursor()
+        except Exception:
+            pool.release(connection, discard=True)
+            raise
 
-        connection.set_session(autocommit=self.autocommit)
-        psycopg2.extras.register_uuid()
-        register_vector(connection)
-        cursor = connection.cursor()
         self.connection = connection
         self.cursor = cursor
 
         return cursor
 
-    def __exit__(self, *args):
-        self.cursor.close()
-        self.connection.close()
+    def __exit__(self, exc_type, *args):
+        try:
+            self.cursor.close()
+        except psycopg2.Error:
+            pass
+
+        discard = exc_type is not None and issubclass(
+            exc_type, (psycopg2.OperationalError, psycopg2.InterfaceError)
+        )
+        pool.release(self.connection, discard=discard)
+
+
+# Lambda keeps the module loaded between warm invocations, so pooled
+# connections and the database secret are reused
+class AuroraConnectionPool(object):
+    def __init__(self, size: int = AURORA_POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._secret = None
+        self._secret_expires_at = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, released_at = self._idle.pop()
+
+            if connection.closed:
+                continue
+            # A server side close, a failover or an idle timeout after the
+            # Lambda was frozen, leaves data to read on the idle socket
+            if time.monotonic() - released_at < AURORA_HEALTH_CHECK_INTERVAL:
+                if not self._has_pending_data(connection):
+                    return connection
+            if self._is_healthy(connection):
+                return connection
+
+            self._close(connection)
+
+        return self._connect()
+
+    def release(self, connection, discard: bool = False):
+        if not discard and not connection.closed:
+            try:
+                # Uncommitted work is dropped, as closing the connection did
+                if not connection.autocommit:
+                    connection.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or connection.closed:
+            self._close(connection)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+
+        self._close(connection)
+
+    def clear(self):
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+
+        for connection, _ in idle:
+            self._close(connection)
+
+    def _connect(self):
+        for attempt in range(AURORA_CONNECT_ATTEMPTS):
+            # The secret is read again after a failure, it may have rotated
+            database_secrets = self._get_database_secrets(force=attempt > 0)
+
+            try:
+                connection = psycopg2.connect(
+                    host=database_secrets["host"],
+                    user=database_secrets["username"],
+                    password=database_secrets["password"],
+                    port=database_secrets["port"],
+                    connect_timeout=10,
+                )
+            except psycopg2.OperationalError as error:
+                if attempt + 1 >= AURORA_CONNECT_ATTEMPTS:
+                    raise error
+
+                print(f"Aurora connection failed, retrying: {error}")
+                time.sleep(2**attempt)
+                continue
+
+            # register_vector runs a query, with autocommit off it would leave
+            # a transaction open and autocommit could no longer be changed
+            connection.autocommit = True
+            register_vector(connection)
+
+            return connection
+
+    def _get_database_secrets(self, force: bool = False):
+        with self._lock:
+            expired = time.monotonic() > self._secret_expires_at
+            if force or self._secret is None or expired:
+                secret_response = secretsmanager_client.get_secret_value(
+                    SecretId=AURORA_DB_SECRET_ID
+                )
+                self._secret = json.loads(secret_response["SecretString"])
+                self._secret_expires_at = time.monotonic() + AURORA_SECRET_TTL
+
+            return self._secret
+
+    def _has_pending_data(self, connection):
+        try:
+            readable, _, _ = select.select([connection.fileno()], [], [], 0)
+        except (OSError, ValueError, psycopg2.Error):
+            return True
+
+        return bool(readable)
+
+    def _is_healthy(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+
+            if not connection.autocommit:
+                connection.rollback()
+
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+
+pool = AuroraConnectionPool()
@@ -1,5 +1,20 @@
 from psycopg2 import sql
+from genai_core.types import CommonError
 from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.indexes import create_vector_index
+from genai_core.aurora.utils import get_partitioned_table, get_tsvector_column
+
+# halfvec and binary_quantize were added in pgvector 0.7.0
+QUANTIZATION_MIN_PGVECTOR_VERSION = (0, 7, 0)
+# Aurora PostgreSQL before 15.5 ships pgvector 0.4, without HNSW
+HNSW_MIN_PGVECTOR_VERSION = (0, 5, 0)
+# Indexes serving the semantic search filters, by index name suffix.
+# text_pattern_ops lets path prefix filters (LIKE 'prefix%') use the index
+FILTER_INDEXES = {
+    "document_type": sql.SQL("(document_type)"),
+    "path": sql.SQL("(path text_pattern_ops)"),
+    "created_at": sql.SQL("(created_at)"),
+}
 
 
 def create_workspace_table(workspace: dict):
@@ -10,9 +25,13 @@ def create_workspace_table(workspace: dict):
     hybrid_search = workspace["hybrid_search"]
     languages = workspace["languages"]
     has_index = workspace["has_index"]
-    metric = workspace["metric"]
+
+    if workspace.get("storage_layout", "table") == "partitioned":
+        return create_workspace_partition(workspace)
 
     with AuroraConnection(autocommit=False) as cursor:
+        _check_workspace_features(cursor, workspace)
+
         cursor.execute(
             sql.SQL(
                 """CREATE TABLE {table} (
@@ -27,6 +46,7 @@ def create_workspace_table(workspace: dict):
                     title TEXT,
                     content TEXT, 
                     content_complement TEXT, 
+                    content_hash VARCHAR(64),
                     content_embeddings vector(%s),
                     metadata JSONB,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -45,33 +65,197 @@ def create_workspace_table(workspace: dict):
             )
         )
 
+        _add_filter_indexes(cursor, table_name)
+
         if hybrid_search:
             for language in languages:
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING GIN (to_tsvector('{language}', content));"
-                    ).format(table=table_name, language=sql.Identifier(language))
-                )
+                _add_tsvector_column(cursor, table_name, language)
 
-        if has_index:
-            if metric == "cosine":
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_cosine_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
-                )
-            elif metric == "l2":
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_l2_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
+        # IVF centroids trained on an empty table give poor recall, the
+        # IVF index is built by ensure_workspace_index once rows are added
+        if has_index and workspace.get("index_type", "ivfflat") == "hnsw":
+            create_vector_index(cursor, workspace)
+
+        cursor.connection.commit()
+        print("Created workspace table")
+
+
+# The partition keeps the workspace table name, so reads and writes only
+# scan its rows. Its ANN and keyword indexes are built before it is attached
+def create_workspace_partition(workspace: dict):
+    workspace_id = workspace["workspace_id"]
+    table_name = sql.Identifier(workspace_id.replace("-", ""))
+    parent_name = get_partitioned_table(workspace["embeddings_model_dimensions"])
+    parent = sql.Identifier(parent_name)
+
+    with AuroraConnection(autocommit=False) as cursor:
+        _check_workspace_features(cursor, workspace)
+
+        # CREATE TABLE IF NOT EXISTS races with itself, concurrent creates
+        # wait here until the transaction that creates the parent commits
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtext(%s));",
+            [f"partitioned_{parent_name}"],
+        )
+
+        # The key has to include the partition column, chunk_id leads so
+        # that lookups by chunk_id alone use the key index of the partition
+        cursor.execute(
+            sql.SQL(
+                """CREATE TABLE IF NOT EXISTS {parent} (
+                    chunk_id UUID NOT NULL, 
+                    workspace_id UUID NOT NULL,
+                    document_id UUID,
+                    document_sub_id UUID,
+                    document_type VARCHAR(50),
+                    document_sub_type VARCHAR(50),
+                    path TEXT, 
+                    language VARCHAR(15),
+                    title TEXT,
+                    content TEXT, 
+                    content_complement TEXT, 
+                    content_hash VARCHAR(64),
+                    content_embeddings vector(%s),
+                    metadata JSONB,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (chunk_id, workspace_id)
+                ) PARTITION BY LIST (workspace_id);"""
+            ).format(parent=parent),
+            [workspace["embeddings_model_dimensions"]],
+        )
+
+        # Partitioned indexes, created on every partition when attached
+        for column in ["document_id", "document_sub_id"]:
+            cursor.execute(
+                sql.SQL(
+                    "CREATE INDEX IF NOT EXISTS {index} ON {parent} ({column});"
+                ).format(
+                    index=sql.Identifier(f"{parent_name}_{column}"),
+                    parent=parent,
+                    column=sql.Identifier(column),
                 )
-            elif metric == "inner":
+            )
+
+        _add_filter_indexes(cursor, parent)
+
+        cursor.execute(
+            sql.SQL("CREATE TABLE {table} (LIKE {parent} INCLUDING DEFAULTS);").format(
+                table=table_name, parent=parent
+            )
+        )
+
+        # Generated columns would have to exist on every partition, keyword
+        # search reads the indexed expression instead
+        if workspace["hybrid_search"]:
+            for language in workspace["languages"]:
+                index_name = f"{table_name.string}_{get_tsvector_column(language)}"
                 cursor.execute(
                     sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_ip_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
+                        "CREATE INDEX {index} ON {table} USING GIN (to_tsvector({language}::regconfig, content));"
+                    ).format(
+                        index=sql.Identifier(index_name),
+                        table=table_name,
+                        language=sql.Literal(language),
+                    )
                 )
 
+        index_type = workspace.get("index_type", "ivfflat")
+        if workspace["has_index"] and index_type == "hnsw":
+            create_vector_index(cursor, workspace)
+
+        cursor.execute(
+            sql.SQL(
+                "ALTER TABLE {parent} ATTACH PARTITION {table} FOR VALUES IN (%s);"
+            ).format(parent=parent, table=table_name),
+            [workspace_id],
+        )
+
         cursor.connection.commit()
-        print("Created workspace table")
+        print(f"Created workspace partition of {parent_name}")
+
+
+# Adding a stored generated column rewrites the whole table, run it when
+# the workspace is not being written to
+def add_tsvector_columns(workspace: dict):
+    workspace_id = workspace["workspace_id"]
+    table_name = sql.Identifier(workspace_id.replace("-", ""))
+
+    # Partitions index the tsvector expression, see create_workspace_partition
+    if (
+        not workspace["hybrid_search"]
+        or workspace.get("storage_layout", "table") == "partitioned"
+    ):
+        return
+
+    with AuroraConnection(autocommit=False) as cursor:
+        for language in workspace["languages"]:
+            _add_tsvector_column(cursor, table_name, language)
+
+        cursor.connection.commit()
+        print("Added tsvector columns")
+
+
+# For tables created before the filter indexes, built concurrently
+def add_filter_indexes(workspace: dict):
+    table = workspace["workspace_id"].replace("-", "")
+    concurrently = True
+    if workspace.get("storage_layout", "table") == "partitioned":
+        table = get_partitioned_table(workspace["embeddings_model_dimensions"])
+        concurrently = False
+
+    with AuroraConnection() as cursor:
+        _add_filter_indexes(cursor, sql.Identifier(table), concurrently)
+
+    print("Added filter indexes")
+
+
+def _add_filter_indexes(cursor, table_name: sql.Identifier, concurrently: bool = False):
+    for name, expression in FILTER_INDEXES.items():
+        cursor.execute(
+            sql.SQL(
+                "CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} {expression};"
+            ).format(
+                concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+                index=sql.Identifier(f"{table_name.string}_{name}"),
+                table=table_name,
+                expression=expression,
+            )
+        )
+
+
+def _add_tsvector_column(cursor, table_name: sql.Identifier, language: str):
+    # Computed once on insert, keyword search reads the stored value
+    column = sql.Identifier(get_tsvector_column(language))
+    cursor.execute(
+        sql.SQL(
+            """ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector 
+                GENERATED ALWAYS AS (to_tsvector({language}::regconfig, coalesce(content, ''))) STORED;"""
+        ).format(table=table_name, column=column, language=sql.Literal(language))
+    )
+
+    index_name = f"{table_name.string}_{get_tsvector_column(language)}"
+    cursor.execute(
+        sql.SQL(
+            "CREATE INDEX IF NOT EXISTS {index} ON {table} USING GIN ({column});"
+        ).format(index=sql.Identifier(index_name), table=table_name, column=column)
+    )
+
+
+def _check_workspace_features(cursor, workspace: dict):
+    if workspace.get("quantization", "none") != "none":
+        _check_pgvector_version(
+            cursor, QUANTIZATION_MIN_PGVECTOR_VERSION, "Vector quantization"
+        )
+
+    if workspace["has_index"] and workspace.get("index_type", "ivfflat") == "hnsw":
+        _check_pgvector_version(cursor, HNSW_MIN_PGVECTOR_VERSION, "HNSW index")
+
+
+def _check_pgvector_version(cursor, min_version: tuple, feature: str):
+    cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+    row = cursor.fetchone()
+    version = tuple(int(part) for part in row[0].split(".")) if row else ()
+
+    if version < min_version:
+        required = ".".join(str(part) for part in min_version)
+        raise CommonError(f"{feature} requires pgvector {required} or later")
@@ -7,6 +7,7 @@ import genai_core.types
 import psycopg2
 from psycopg2 import sql
 from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.utils import get_partitioned_table
 from datetime import datetime
 
 PROCESSING_BUCKET_NAME = os.environ["PROCESSING_BUCKET_NAME"]
@@ -29,7 +30,10 @@ def delete_aurora_workspace(workspace: dict):
     )
 
     table_name = sql.Identifier(workspace_id.replace("-", ""))
-    with AuroraConnection(autocommit=False) as cursor:
+    with AuroraConnection() as cursor:
+        if workspace.get("storage_layout", "table") == "partitioned":
+            _detach_workspace_partition(cursor, workspace)
+
         cursor.execute(
             sql.SQL("DROP TABLE IF EXISTS {table};").format(table=table_name)
         )
@@ -125,6 +129,33 @@ def delete_aurora_document(workspace_id: str, document: dict):
     except (BotoCoreError, ClientError) as error:
         print(f"An error occurred: {error}")
 
+
+# Detaching concurrently only blocks writes to the detached partition,
+# it cannot run inside a transaction
+def _detach_workspace_partition(cursor, workspace: dict):
+    table = workspace["workspace_id"].replace("-", "")
+    parent = get_partitioned_table(workspace["embeddings_model_dimensions"])
+
+    # Already detached when a previous attempt failed after this step, an
+    # interrupted concurrent detach is left pending and is finalized
+    cursor.execute(
+        "SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(%s);",
+        [table],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return
+
+    cursor.execute(
+        sql.SQL("ALTER TABLE {parent} DETACH PARTITION {table} {mode};").format(
+            parent=sql.Identifier(parent),
+            table=sql.Identifier(table),
+            mode=sql.SQL("FINALIZE" if row[0] else "CONCURRENTLY"),
+        )
+    )
+    print(f"Detached workspace partition from {parent}")
+
+
 def deleteAuroraDocument(document_id: str, table_name: str):
     try:
         with AuroraConnection(autocommit=False) as cursor:
@@ -0,0 +1,203 @@
+import os
+import re
+import math
+from psycopg2 import sql
+from typing import Optional
+from genai_core.types import CommonError
+from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.utils import get_index_expression
+
+# IVF centroids are trained on the rows present when the index is built,
+# below this row count an exact scan is fast and the index is not built
+AURORA_IVFFLAT_MIN_ROWS = int(os.environ.get("AURORA_IVFFLAT_MIN_ROWS", 10000))
+# The IVF index is rebuilt once the row count calls for this many times
+# the lists it was built with
+AURORA_IVFFLAT_REBUILD_FACTOR = 2
+HNSW_DEFAULT_M = 16
+HNSW_DEFAULT_EF_CONSTRUCTION = 64
+
+
+def get_ivfflat_lists(rows: int) -> int:
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above
+    if rows <= 1000000:
+        return max(rows // 1000, 10)
+
+    return int(math.sqrt(rows))
+
+
+def create_vector_index(
+    cursor, workspace: dict, lists: Optional[int] = None, concurrently: bool = False
+):
+    """Creates the ANN index of the workspace table and returns its name"""
+    table = workspace["workspace_id"].replace("-", "")
+    index_type = workspace.get("index_type", "ivfflat")
+    expression, ops = get_index_expression(
+        workspace["metric"],
+        workspace.get("quantization", "none"),
+        workspace["embeddings_model_dimensions"],
+    )
+
+    if index_type == "hnsw":
+        index_name = f"{table}_hnsw"
+        method = sql.SQL("hnsw")
+        parameters = sql.SQL("m = {m}, ef_construction = {ef_construction}").format(
+            m=sql.Literal(int(workspace.get("hnsw_m") or HNSW_DEFAULT_M)),
+            ef_construction=sql.Literal(
+                int(
+                    workspace.get("hnsw_ef_construction")
+                    or HNSW_DEFAULT_EF_CONSTRUCTION
+                )
+            ),
+        )
+    elif index_type == "ivfflat":
+        lists = lists if lists else get_ivfflat_lists(0)
+        index_name = f"{table}_ivfflat_{lists}"
+        method = sql.SQL("ivfflat")
+        parameters = sql.SQL("lists = {lists}").format(lists=sql.Literal(lists))
+    else:
+        raise CommonError("Unknown index type")
+
+    valid = _is_index_valid(cursor, index_name)
+    if valid:
+        return index_name
+    elif valid is not None:
+        # A failed concurrent build leaves an invalid index behind
+        cursor.execute(
+            sql.SQL("DROP INDEX IF EXISTS {index};").format(
+                index=sql.Identifier(index_name)
+            )
+        )
+
+    cursor.execute(
+        sql.SQL(
+            "CREATE INDEX {concurrently} {index} ON {table} USING {method} ({expression} {ops}) WITH ({parameters});"
+        ).format(
+            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+            index=sql.Identifier(index_name),
+            table=sql.Identifier(table),
+            method=method,
+            expression=expression,
+            ops=ops,
+            parameters=parameters,
+        )
+    )
+
+    return index_name
+
+
+def ensure_workspace_index(workspace: dict):
+    """Builds or rebuilds the ANN index once the table has enough rows"""
+    if not workspace.get("has_index"):
+        return None
+
+    table = workspace["workspace_id"].replace("-", "")
+
+    with AuroraConnection() as cursor:
+        # Concurrent imports of the workspace would build the same index,
+        # the lock is held by the session and released before it is reused
+        cursor.execute(
+            "SELECT pg_try_advisory_lock(hashtext(%s));", [f"vector_index_{table}"]
+        )
+        if not cursor.fetchone()[0]:
+            print("Vector index build in progress in another session")
+            return None
+
+        try:
+            return _ensure_vector_index(cursor, workspace, table)
+        finally:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(hashtext(%s));", [f"vector_index_{table}"]
+            )
+
+
+def _ensure_vector_index(cursor, workspace: dict, table: str):
+    index_type = workspace.get("index_type", "ivfflat")
+    current = _get_vector_index(cursor, table)
+    valid = current is not None and current[2]
+
+    if index_type == "hnsw":
+        # HNSW needs no training, it is built once and kept up to date
+        if not valid or "USING hnsw" not in current[1]:
+            return _replace_vector_index(cursor, workspace, current)
+
+        return None
+
+    rows = _get_estimated_rows(cursor, table)
+    if rows < AURORA_IVFFLAT_MIN_ROWS:
+        print(f"Workspace table has about {rows} rows, index build deferred")
+        return None
+
+    lists = get_ivfflat_lists(rows)
+    if valid:
+        current_lists = _get_index_lists(current[1])
+        if (
+            current_lists is not None
+            and lists < current_lists * AURORA_IVFFLAT_REBUILD_FACTOR
+        ):
+            return None
+
+    return _replace_vector_index(cursor, workspace, current, lists)
+
+
+def _replace_vector_index(
+    cursor, workspace: dict, current: Optional[tuple], lists: Optional[int] = None
+):
+    index_name = create_vector_index(cursor, workspace, lists=lists, concurrently=True)
+
+    # The new index is in place before the old one is removed
+    if current is not None and current[0] != index_name:
+        cursor.execute(
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index};").format(
+                index=sql.Identifier(current[0])
+            )
+        )
+
+    print(f"Built vector index {index_name}")
+
+    return index_name
+
+
+def _get_vector_index(cursor, table: str):
+    # A valid index is preferred over one left by a failed build
+    cursor.execute(
+        """SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = to_regclass(quote_ident(%s))
+            AND pg_get_indexdef(i.indexrelid) ~ ' USING (ivfflat|hnsw) '
+            ORDER BY i.indisvalid DESC;""",
+        [table],
+    )
+
+    return cursor.fetchone()
+
+
+def _is_index_valid(cursor, index_name: str) -> Optional[bool]:
+    cursor.execute(
+        """SELECT i.indisvalid FROM pg_index i
+            WHERE i.indexrelid = to_regclass(quote_ident(%s));""",
+        [index_name],
+    )
+    row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+def _get_estimated_rows(cursor, table: str) -> int:
+    # The planner statistics avoid a full scan of the table, ANALYZE reads
+    # a fixed size sample so the estimate includes the rows just added
+    cursor.execute(sql.SQL("ANALYZE {table};").format(table=sql.Identifier(table)))
+    cursor.execute(
+        """SELECT reltuples::bigint FROM pg_class
+            WHERE oid = to_regclass(quote_ident(%s));""",
+        [table],
+    )
+    row = cursor.fetchone()
+
+    # reltuples is -1 for a table that was never analyzed
+    return max(row[0], 0) if row else 0
+
+
+def _get_index_lists(indexdef: str) -> Optional[int]:
+    match = re.search(r"lists\s*=\s*'?(\d+)", indexdef)
+
+    return int(match.group(1)) if match else None
@@ -1,16 +1,41 @@
-import numpy as np
 import genai_core.embeddings
+import genai_core.workspaces
 import genai_core.cross_encoder
 import genai_core.utils.comprehend
-from typing import List
+from typing import List, Optional
 from psycopg2 import sql
 from genai_core.aurora.connection import AuroraConnection
-from genai_core.aurora.utils import convert_types
+from genai_core.aurora.utils import (
+    FUSION_RANK_CONSTANT,
+    QUANTIZATION_OVERSAMPLING,
+    convert_types,
+    get_filter_conditions,
+    get_metric_operator,
+    get_quantized_distance,
+    get_tsvector_column,
+    get_tsvector_languages,
+    set_search_params,
+)
 from aws_lambda_powertools import Logger
-from genai_core.types import CommonError, Task
+from genai_core.types import CommonError, SemanticSearchFilters, Task
 
 logger = Logger()
 
+CHUNK_COLUMNS = [
+    "chunk_id",
+    "workspace_id",
+    "document_id",
+    "document_sub_id",
+    "document_type",
+    "document_sub_type",
+    "path",
+    "language",
+    "title",
+    "content",
+    "content_complement",
+    "metadata",
+]
+
 
 def query_workspace_aurora(
     workspace_id: str,
@@ -19,6 +44,8 @@ def query_workspace_aurora(
     limit: int,
     full_response: bool,
     threshold: int = 0,
+    vector_search_params: Optional[dict] = None,
+    filters: Optional[SemanticSearchFilters] = None,
 ):
     table_name = sql.Identifier(workspace_id.replace("-", ""))
     embeddings_model_provider = workspace["embeddings_model_provider"]
@@ -28,8 +55,16 @@ def query_workspace_aurora(
     metric = workspace["metric"]
     hybrid_search = workspace["hybrid_search"]
     languages = workspace["languages"]
-    vector_search_limit = 25
+    quantization = workspace.get("quantization", "none")
+    embeddings_model_dimensions = workspace["embeddings_model_dimensions"]
+    search_params = genai_core.workspaces.get_vector_search_params(
+        workspace, vector_search_params
+    )
+    vector_search_limit = search_params.k
     keyword_search_limit = 25
+    # Candidates are read without their content, which is only fetched
+    # for the reranked candidates and the returned items
+    two_phase = search_params.rerank_candidates is not None
 
     selected_model = genai_core.embeddings.get_embeddings_model(
         embeddings_model_provider, embeddings_model_name
@@ -46,90 +81,171 @@ def query_workspace_aurora(
         raise CommonError("Cross encoder model not found")
 
     query_embeddings = genai_core.embeddings.generate_embeddings(
-        selected_model, [query], Task.RETRIEVE
+        selected_model,
+        [query],
+        Task.RETRIEVE,
+        as_array=True,
+        dimensions=embeddings_model_dimensions,
     )[0]
 
     language_name, detected_languages = genai_core.utils.comprehend.get_query_language(
         query, languages
     )
 
+    filter_conditions, filter_params = get_filter_conditions(filters)
+
     items = []
     vector_search_records = []
     keyword_search_records = []
     with AuroraConnection() as cursor:
-        if metric == "cosine":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <=> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        elif metric == "l2":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <-> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        elif metric == "inner":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <#> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        else:
-            raise Exception("Unknown metric")
-
-        vector_search_records = cursor.fetchall()
-        vector_search_records = _convert_records("vector_search", vector_search_records)
-        items.extend(vector_search_records)
+        operator, _ = get_metric_operator(metric)
+        vector_search_candidates = vector_search_limit
+        if quantization != "none":
+            vector_search_candidates *= QUANTIZATION_OVERSAMPLING
+        set_search_params(
+            cursor,
+            search_params.probes,
+            search_params.ef_search,
+            vector_search_candidates,
+        )
 
         if hybrid_search:
             language = sql.Identifier(language_name)
+            table = workspace_id.replace("-", "")
+            if language_name in get_tsvector_languages(cursor, table):
+                document = sql.Identifier(get_tsvector_column(language_name))
+            else:
+                document = sql.SQL("to_tsvector('{language}', content)").format(
+                    language=language
+                )
 
+            # Vector and keyword search ranked and fused in one statement,
+            # only the fused candidates are read from the table
+            if two_phase:
+                columns = sql.SQL("f.chunk_id")
+                fused = sql.SQL("fused f")
+            else:
+                columns = sql.SQL(", ").join(
+                    [sql.Identifier("t", column) for column in CHUNK_COLUMNS]
+                )
+                fused = sql.SQL(
+                    "fused f JOIN {table} t ON t.chunk_id = f.chunk_id"
+                ).format(table=table_name)
+            vector_candidates, vector_candidates_params = _get_vector_candidates(
+                table_name,
+                metric,
+                quantization,
+                embeddings_model_dimensions,
+                query_embeddings,
+                vector_search_candidates,
+                vector_search_limit,
+                filter_conditions,
+                filter_params,
+            )
             cursor.execute(
                 sql.SQL(
-                    """SELECT chunk_id, 
+                    """WITH vector_candidates AS ({vector_candidates}), 
+                    vector_search AS (
+                        SELECT chunk_id, 
+                            vector_search_score, 
+                            row_number() OVER (ORDER BY vector_search_score) AS vector_search_rank 
+                        FROM vector_candidates
+                    ), 
+                    keyword_search AS (
+                        SELECT chunk_id, 
+                            keyword_search_score, 
+                            row_number() OVER (ORDER BY keyword_search_score DESC) AS keyword_search_rank 
+                        FROM (
+                            SELECT chunk_id, 
+                                ts_rank_cd({document}, query) AS keyword_search_score 
+                            FROM {table}, 
+                            plainto_tsquery('{language}', %s) query 
+                            WHERE {document} @@ query AND {filters} 
+                            ORDER BY keyword_search_score DESC 
+                            LIMIT %s
+                        ) keyword_candidates
+                    ), 
+                    fused AS (
+                        SELECT COALESCE(v.chunk_id, k.chunk_id) AS chunk_id, 
+                            v.vector_search_score, 
+                            k.keyword_search_score, 
+                            COALESCE(1.0 / (%s + v.vector_search_rank), 0) 
+                            + COALESCE(1.0 / (%s + k.keyword_search_rank), 0) AS fusion_score, 
+                            v.vector_search_rank, 
+                            k.keyword_search_rank 
+                        FROM vector_search v 
+                        FULL OUTER JOIN keyword_search k ON v.chunk_id = k.chunk_id 
+                        ORDER BY fusion_score DESC 
+                        LIMIT %s
+                    ) 
+                    SELECT {columns}, 
+                        f.vector_search_score, 
+                        f.keyword_search_score, 
+                        f.fusion_score, 
+                        f.vector_search_rank, 
+                        f.keyword_search_rank 
+                    FROM {fused} 
+                    ORDER BY f.fusion_score DESC;"""
+                ).format(
+                    vector_candidates=vector_candidates,
+                    table=table_name,
+                    language=language,
+                    document=document,
+                    columns=columns,
+                    fused=fused,
+                    filters=filter_conditions,
+                ),
+                vector_candidates_params
+                + [query]
+                + filter_params
+                + [
+                    keyword_search_limit,
+                    FUSION_RANK_CONSTANT,
+                    FUSION_RANK_CONSTANT,
+                    vector_search_limit + keyword_search_limit,
+                ],
+            )
+
+            items = _convert_fused_records(cursor.fetchall())
+            vector_search_records = sorted(
+                [item for item in items if item["vector_search_rank"] is not None],
+                key=lambda x: x["vector_search_rank"],
+            )
+            keyword_search_records = sorted(
+                [item for item in items if item["keyword_search_rank"] is not None],
+                key=lambda x: x["keyword_search_rank"],
+            )
+        elif two_phase:
+            vector_candidates, vector_candidates_params = _get_vector_candidates(
+                table_name,
+                metric,
+                quantization,
+                embeddings_model_dimensions,
+                query_embeddings,
+                vector_search_candidates,
+                vector_search_limit,
+                filter_conditions,
+                filter_params,
+            )
+            cursor.execute(vector_candidates, vector_candidates_params)
+
+            vector_search_records = [
+                {
+                    **dict.fromkeys(CHUNK_COLUMNS),
+                    "chunk_id": record[0],
+                    "sources": ["vector_search"],
+                    "score": None,
+                    "vector_search_score": record[1],
+                    "keyword_search_score": None,
+                }
+                for record in cursor.fetchall()
+            ]
+            items.extend(vector_search_records)
+        else:
+            if quantization == "none":
+                cursor.execute(
+                    sql.SQL(
+                        """SELECT chunk_id, 
                             workspace_id,
                             document_id, 
                             document_sub_id, 
@@ -141,21 +257,61 @@ def query_workspace_aurora(
                             content,
                             content_complement,
                             metadata,
-                            ts_rank_cd(to_tsvector('{language}', content), query) AS keyword_search_score
-                            FROM {table}, 
-                            plainto_tsquery('{language}', %s) query 
-                            WHERE to_tsvector('{language}', content) @@ query 
-                            ORDER BY keyword_search_score DESC 
-                            LIMIT %s;"""
-                ).format(table=table_name, language=language),
-                [query, keyword_search_limit],
-            )
+                            content_embeddings {operator} %s AS vector_search_score 
+                    FROM {table} WHERE {filters} 
+                    ORDER BY vector_search_score LIMIT %s;"""
+                    ).format(
+                        table=table_name,
+                        operator=sql.SQL(operator),
+                        filters=filter_conditions,
+                    ),
+                    [query_embeddings] + filter_params + [vector_search_limit],
+                )
+            else:
+                # Read candidates through the quantized index, then rerank
+                # them against the full precision vectors
+                quantized_distance = get_quantized_distance(
+                    metric, quantization, embeddings_model_dimensions
+                )
+                cursor.execute(
+                    sql.SQL(
+                        """SELECT chunk_id, 
+                            workspace_id,
+                            document_id, 
+                            document_sub_id, 
+                            document_type,
+                            document_sub_type,
+                            path,
+                            language,
+                            title,
+                            content,
+                            content_complement,
+                            metadata,
+                            content_embeddings {operator} %s AS vector_search_score 
+                    FROM (
+                        SELECT * FROM {table} WHERE {filters} 
+                        ORDER BY {quantized_distance} LIMIT %s
+                    ) candidates ORDER BY vector_search_score LIMIT %s;"""
+                    ).format(
+                        table=table_name,
+                        operator=sql.SQL(operator),
+                        quantized_distance=quantized_distance,
+                        filters=filter_conditions,
+                    ),
+                    [query_embeddings]
+                    + filter_params
+                    + [
+                        query_embeddings,
+                        vector_search_candidates,
+                        vector_search_limit,
+                    ],
+                )
 
-            keyword_search_records = cursor.fetchall()
-            keyword_search_records = _convert_records(
-                "keyword_search", keyword_search_records
+            vector_search_records = cursor.fetchall()
+            vector_search_records = _convert_records(
+                "vector_search", vector_search_records
             )
-            items.extend(keyword_search_records)
+            items.extend(vector_search_records)
 
     unique_items = dict({})
     for item in items:
@@ -186,6 +342,16 @@ def query_workspace_aurora(
                 item["keyword_search_score"] = current["keyword_search_score"]
 
     unique_items = list(unique_items.values())
+    if two_phase:
+        # Candidates are in first stage order, the others are not reranked
+        unique_items = unique_items[: search_params.rerank_candidates]
+        contents = _get_chunk_contents(
+            table_name, [item["chunk_id"] for item in unique_items]
+        )
+        unique_items = [item for item in unique_items if item["chunk_id"] in contents]
+        for item in unique_items:
+            item["content"] = contents[item["chunk_id"]]
+
     score_dict = dict({})
     if len(unique_items) > 0:
         passages = [record["content"] for record in unique_items]
@@ -201,12 +367,18 @@ def query_workspace_aurora(
     unique_items = sorted(unique_items, key=lambda x: x["score"], reverse=True)
 
     for record in vector_search_records:
-        record["score"] = score_dict[record["chunk_id"]]
+        record["score"] = score_dict.get(record["chunk_id"])
     for record in keyword_search_records:
-        record["score"] = score_dict[record["chunk_id"]]
+        record["score"] = score_dict.get(record["chunk_id"])
 
     if full_response:
         unique_items = unique_items[:limit]
+        if two_phase:
+            _hydrate_records(
+                table_name,
+                unique_items + vector_search_records + keyword_search_records,
+            )
+
         ret_value = {
             "engine": "aurora",
             "query_language": language_name,
@@ -252,6 +424,9 @@ def query_workspace_aurora(
                     )[: (limit - len(ret_items))]
                 )
 
+        if two_phase:
+            _hydrate_records(table_name, ret_items)
+
         ret_value = {
             "engine": "aurora",
             "query_language": language_name,
@@ -297,3 +472,126 @@ def _convert_records(source: str, records: List[dict]):
         converted_records.append(converted)
 
     return converted_records
+
+
+def _get_vector_candidates(
+    table_name: sql.Identifier,
+    metric: str,
+    quantization: str,
+    dimensions: int,
+    query_embeddings,
+    candidates: int,
+    limit: int,
+    filter_conditions: sql.Composable,
+    filter_params: List,
+):
+    operator, _ = get_metric_operator(metric)
+    if quantization == "none":
+        return (
+            sql.SQL(
+                """SELECT chunk_id, 
+                    content_embeddings {operator} %s AS vector_search_score 
+                FROM {table} WHERE {filters} 
+                ORDER BY vector_search_score LIMIT %s"""
+            ).format(
+                table=table_name,
+                operator=sql.SQL(operator),
+                filters=filter_conditions,
+            ),
+            [query_embeddings] + filter_params + [limit],
+        )
+
+    quantized_distance = get_quantized_distance(metric, quantization, dimensions)
+
+    return (
+        sql.SQL(
+            """SELECT chunk_id, 
+                content_embeddings {operator} %s AS vector_search_score 
+            FROM (
+                SELECT chunk_id, content_embeddings FROM {table} 
+                WHERE {filters} 
+                ORDER BY {quantized_distance} LIMIT %s
+            ) quantized_candidates ORDER BY vector_search_score LIMIT %s"""
+        ).format(
+            table=table_name,
+            operator=sql.SQL(operator),
+            quantized_distance=quantized_distance,
+            filters=filter_conditions,
+        ),
+        [query_embeddings] + filter_params + [query_embeddings, candidates, limit],
+    )
+
+
+# Fused rows hold all the chunk columns or only the chunk id, followed
+# by the search scores and ranks
+def _convert_fused_records(records: List[tuple]):
+    converted_records = []
+    for record in records:
+        columns = record[:-5]
+        (
+            vector_search_score,
+            keyword_search_score,
+            fusion_score,
+            vector_search_rank,
+            keyword_search_rank,
+        ) = record[-5:]
+
+        sources = []
+        if vector_search_rank is not None:
+            sources.append("vector_search")
+        if keyword_search_rank is not None:
+            sources.append("keyword_search")
+
+        converted = {
+            **dict.fromkeys(CHUNK_COLUMNS),
+            **dict(zip(CHUNK_COLUMNS, columns)),
+            "sources": sorted(sources),
+            "score": None,
+            "vector_search_score": vector_search_score,
+            "keyword_search_score": keyword_search_score,
+            "fusion_score": float(fusion_score),
+            "vector_search_rank": vector_search_rank,
+            "keyword_search_rank": keyword_search_rank,
+        }
+
+        converted_records.append(converted)
+
+    return converted_records
+
+
+def _get_chunk_contents(table_name: sql.Identifier, chunk_ids: List):
+    if not chunk_ids:
+        return {}
+
+    with AuroraConnection() as cursor:
+        cursor.execute(
+            sql.SQL(
+                "SELECT chunk_id, content FROM {table} WHERE chunk_id = ANY(%s);"
+            ).format(table=table_name),
+            [chunk_ids],
+        )
+
+        return {record[0]: record[1] for record in cursor.fetchall()}
+
+
+# Records retrieved without their columns are updated in place
+def _hydrate_records(table_name: sql.Identifier, records: List[dict]):
+    chunk_ids = list(dict.fromkeys(record["chunk_id"] for record in records))
+    if not chunk_ids:
+        return
+
+    with AuroraConnection() as cursor:
+        cursor.execute(
+            sql.SQL("SELECT {columns} FROM {table} WHERE chunk_id = ANY(%s);").format(
+                columns=sql.SQL(", ").join(map(sql.Identifier, CHUNK_COLUMNS)),
+                table=table_name,
+            ),
+            [chunk_ids],
+        )
+
+        rows = {record[0]: record for record in cursor.fetchall()}
+
+    for record in records:
+        row = rows.get(record["chunk_id"])
+        if row is not None:
+            record.update(zip(CHUNK_COLUMNS, row))
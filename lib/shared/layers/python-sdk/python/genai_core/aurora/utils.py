@@ -1,4 +1,30 @@
 import uuid
+from psycopg2 import sql
+from typing import List, Optional
+from genai_core.types import CommonError, SemanticSearchFilters
+
+# Operator and index operator class for every supported metric
+METRIC_OPERATORS = {
+    "cosine": ("<=>", "vector_cosine_ops"),
+    "l2": ("<->", "vector_l2_ops"),
+    "inner": ("<#>", "vector_ip_ops"),
+}
+
+# Candidates read from the quantized index for every result kept after
+# reranking against the full precision vectors
+QUANTIZATION_OVERSAMPLING = 4
+
+# Reciprocal rank fusion constant, a rank r contributes 1 / (k + r)
+FUSION_RANK_CONSTANT = 60
+
+# Search time defaults, pgvector itself scans a single IVF list
+DEFAULT_IVFFLAT_PROBES = 10
+DEFAULT_HNSW_EF_SEARCH = 40
+# Largest hnsw.ef_search accepted by pgvector
+MAX_HNSW_EF_SEARCH = 1000
+
+# Languages with a stored tsvector column, by table
+_tsvector_languages = {}
 
 
 def convert_types(data):
@@ -10,3 +36,133 @@ def convert_types(data):
         return str(data)
     else:
         return data
+
+
+def get_metric_operator(metric: str):
+    if metric not in METRIC_OPERATORS:
+        raise CommonError("Unknown metric")
+
+    return METRIC_OPERATORS[metric]
+
+
+# Quantized workspaces keep the full precision column and index a cast of it
+def get_index_expression(metric: str, quantization: str, dimensions: int):
+    _, ops = get_metric_operator(metric)
+    dimensions = int(dimensions)
+
+    if quantization == "float16":
+        expression = sql.SQL("(content_embeddings::halfvec({dimensions}))").format(
+            dimensions=sql.Literal(dimensions)
+        )
+
+        return expression, sql.SQL(ops.replace("vector_", "halfvec_"))
+    elif quantization == "binary":
+        expression = sql.SQL(
+            "(binary_quantize(content_embeddings)::bit({dimensions}))"
+        ).format(dimensions=sql.Literal(dimensions))
+
+        return expression, sql.SQL("bit_hamming_ops")
+    elif quantization in [None, "none"]:
+        return sql.SQL("content_embeddings"), sql.SQL(ops)
+
+    raise CommonError("Unknown quantization")
+
+
+def get_quantized_distance(metric: str, quantization: str, dimensions: int):
+    operator, _ = get_metric_operator(metric)
+    dimensions = int(dimensions)
+
+    if quantization == "float16":
+        # The query vector is bound as an untyped literal, it is cast to
+        # vector first so that the halfvec cast is not ambiguous
+        return sql.SQL(
+            "content_embeddings::halfvec({dimensions}) {operator} "
+            "%s::vector::halfvec({dimensions})"
+        ).format(dimensions=sql.Literal(dimensions), operator=sql.SQL(operator))
+    elif quantization == "binary":
+        # binary_quantize has vector and halfvec overloads
+        return sql.SQL(
+            "binary_quantize(content_embeddings)::bit({dimensions}) <~> "
+            "binary_quantize(%s::vector)::bit({dimensions})"
+        ).format(dimensions=sql.Literal(dimensions))
+
+    raise CommonError("Unknown quantization")
+
+
+# Pooled connections keep session settings, both are set on every query
+def set_search_params(cursor, probes: Optional[int], ef_search: Optional[int], k: int):
+    probes = probes or DEFAULT_IVFFLAT_PROBES
+    # HNSW returns at most ef_search rows
+    ef_search = min(max(ef_search or DEFAULT_HNSW_EF_SEARCH, k), MAX_HNSW_EF_SEARCH)
+
+    cursor.execute(
+        """SELECT set_config('ivfflat.probes', %s, false), 
+            set_config('hnsw.ef_search', %s, false);""",
+        [str(probes), str(ef_search)],
+    )
+
+
+# The conditions are TRUE when no filter is set
+def get_filter_conditions(filters: Optional[SemanticSearchFilters]):
+    conditions = []
+    params = []
+    if filters is not None:
+        if filters.document_types:
+            conditions.append(sql.SQL("document_type = ANY(%s)"))
+            params.append(list(filters.document_types))
+        if filters.document_ids:
+            conditions.append(sql.SQL("document_id = ANY(%s::uuid[])"))
+            params.append(_get_document_uuids(filters.document_ids))
+        if filters.path_prefix:
+            # Served by the text_pattern_ops index on path
+            conditions.append(sql.SQL("path LIKE %s"))
+            params.append(_escape_like(filters.path_prefix) + "%")
+        if filters.created_after:
+            conditions.append(sql.SQL("created_at >= %s"))
+            params.append(filters.created_after)
+        if filters.created_before:
+            conditions.append(sql.SQL("created_at < %s"))
+            params.append(filters.created_before)
+
+    if not conditions:
+        return sql.SQL("TRUE"), []
+
+    return sql.SQL(" AND ").join(conditions), params
+
+
+def _get_document_uuids(document_ids: List[str]) -> List[str]:
+    # Checked before the query, an invalid id would fail the uuid[] cast
+    try:
+        return [str(uuid.UUID(document_id)) for document_id in document_ids]
+    except (TypeError, ValueError):
+        raise CommonError("Invalid document id in filters")
+
+
+def get_partitioned_table(dimensions: int) -> str:
+    # The embeddings column type is shared by every partition
+    return f"workspace_chunks_{int(dimensions)}"
+
+
+def get_tsvector_column(language: str) -> str:
+    return f"content_tsvector_{language}"
+
+
+# Tables created before the tsvector columns existed have none
+def get_tsvector_languages(cursor, table: str) -> set:
+    if table not in _tsvector_languages:
+        prefix = get_tsvector_column("")
+        cursor.execute(
+            """SELECT column_name FROM information_schema.columns 
+                WHERE table_name = %s AND column_name LIKE %s;""",
+            [table, prefix.replace("_", "\\_") + "%"],
+        )
+
+        _tsvector_languages[table] = set(
+            row[0][len(prefix) :] for row in cursor.fetchall()
+        )
+
+    return _tsvector_languages[table]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
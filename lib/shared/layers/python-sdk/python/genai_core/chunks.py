@@ -1,18 +1,45 @@
 import os
+import json
+import time
 import uuid
+import queue
 import boto3
+import hashlib
+import threading
 import genai_core.documents
 import genai_core.embeddings
+import genai_core.embeddings_cache
+import genai_core.tokenizers
+import genai_core.utils.files
 import genai_core.aurora.chunks
 import genai_core.opensearch.chunks
 from genai_core.types import CommonError,Task
-from typing import List, Optional
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+from aws_lambda_powertools import Logger
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 PROCESSING_BUCKET_NAME = os.environ.get("PROCESSING_BUCKET_NAME", "")
+STREAM_READ_SIZE = 1024 * 1024
+STREAM_WINDOW_SIZE = 500
+PIPELINE_BATCH_SIZE = int(os.environ.get("CHUNKS_PIPELINE_BATCH_SIZE", 100))
+CHUNKS_PACK_SUFFIX = ".jsonl"
+CHUNKS_INDEX_SUFFIX = ".index.json"
 s3 = boto3.resource("s3")
+logger = Logger()
 
 
+# With replace only the chunks whose content hash is not stored yet are
+# embedded, stored chunks missing from the new content are removed
 def add_chunks(
     replace: bool,
     workspace: dict,
@@ -21,16 +48,14 @@ def add_chunks(
     chunks: List[str],
     chunk_complements: List[str],
     path: Optional[str] = None,
+    existing_chunks: Optional[Dict[Optional[str], list]] = None,
 ):
     workspace_id = workspace["workspace_id"]
     engine = workspace["engine"]
     embeddings_model_provider = workspace["embeddings_model_provider"]
     embeddings_model_name = workspace["embeddings_model_name"]
     document_id = document["document_id"]
-    document_type = document["document_type"]
-    document_sub_type = document["document_sub_type"]
     path = path if path else document["path"]
-    title = document["title"]
 
     embeddings_model = genai_core.embeddings.get_embeddings_model(
         embeddings_model_provider, embeddings_model_name
@@ -39,70 +64,418 @@ def add_chunks(
     if embeddings_model is None:
         raise CommonError("Embeddings model not found")
 
-    chunk_embeddings = genai_core.embeddings.generate_embeddings(
-        embeddings_model, chunks, Task.STORE.value
-    )
+    complements_len = len(chunk_complements) if chunk_complements else 0
+    chunk_hashes = [
+        get_chunk_hash(chunk, chunk_complements[idx] if idx < complements_len else None)
+        for idx, chunk in enumerate(chunks)
+    ]
+
+    removed_chunk_ids = None
+    if replace and existing_chunks is None:
+        existing_chunks = get_chunk_hashes(workspace, document_id)
+        removed_chunk_ids = []
+
+    new_indices = list(range(len(chunks)))
+    if existing_chunks is not None:
+        new_indices = _match_chunk_hashes(chunk_hashes, existing_chunks)
+    kept_vectors = len(chunks) - len(new_indices)
+
+    if removed_chunk_ids is not None:
+        for chunk_ids in existing_chunks.values():
+            removed_chunk_ids.extend(chunk_ids)
+
+    if kept_vectors > 0:
+        logger.info(f"Unchanged chunks: {kept_vectors}/{len(chunks)}")
+
+    chunks = [chunks[idx] for idx in new_indices]
+    chunk_hashes = [chunk_hashes[idx] for idx in new_indices]
+    if chunk_complements:
+        chunk_complements = [
+            chunk_complements[idx] if idx < complements_len else None
+            for idx in new_indices
+        ]
+
+    if engine not in ["aurora", "opensearch"]:
+        raise CommonError("Engine not supported")
+
     chunk_ids = [uuid.uuid4() for _ in chunks]
+    batch_starts = list(range(0, len(chunks), PIPELINE_BATCH_SIZE)) or [0]
+
+    def embed(start: int):
+        embeddings = genai_core.embeddings.generate_embeddings(
+            embeddings_model,
+            chunks[start : start + PIPELINE_BATCH_SIZE],
+            Task.STORE.value,
+            as_array=True,
+            dimensions=workspace["embeddings_model_dimensions"],
+        )
 
-    store_chunks_on_s3(workspace_id, document_id, document_sub_id, chunk_ids, chunks)
+        return start, embeddings
+
+    # One pack per call, a stream writes one per window. It is written with
+    # the first batch, while the next ones are embedded, and before any of
+    # the vectors pointing at it
+    def persist(batch):
+        start, _ = batch
+        if start == 0:
+            store_chunks_on_s3(
+                workspace_id, document_id, document_sub_id, chunk_ids, chunks
+            )
+
+        return batch
+
+    def write(batch):
+        start, chunk_embeddings = batch
+        end = start + PIPELINE_BATCH_SIZE
+
+        # Removed chunks go with the last batch, so the document stays
+        # searchable until all of its new chunks are written
+        return _add_chunks_to_engine(
+            workspace=workspace,
+            document=document,
+            document_sub_id=document_sub_id,
+            path=path,
+            chunk_ids=chunk_ids[start:end],
+            chunk_embeddings=chunk_embeddings,
+            chunks=chunks[start:end],
+            chunk_complements=chunk_complements[start:end]
+            if chunk_complements
+            else None,
+            chunk_hashes=chunk_hashes[start:end],
+            # Matched chunks are kept, the document is never removed as a whole
+            replace=False,
+            removed_chunk_ids=removed_chunk_ids if start == batch_starts[-1] else None,
+        )
+
+    results, stats = _run_pipeline(
+        batch_starts, [("embed", embed), ("s3", persist), ("store", write)]
+    )
+    cache = genai_core.embeddings_cache.get_embeddings_cache()
+    logger.debug(f"Pipeline: {stats}")
+    logger.debug(f"Embeddings cache: {cache.get_stats()}")
+
+    if removed_chunk_ids:
+        remove_chunks_from_s3(workspace_id, document_id, removed_chunk_ids)
+
+    # Kept chunks still count, in every window of a stream the hashes are
+    # matched against, not only in the first one that sets the vectors
+    added_vectors = sum(result["added_vectors"] for result in results)
+    if existing_chunks is not None:
+        added_vectors += kept_vectors
+
+    genai_core.documents.set_document_vectors(
+        workspace_id, document_id, added_vectors, replace=replace
+    )
+
+
+def _add_chunks_to_engine(
+    workspace: dict,
+    document: dict,
+    document_sub_id: Optional[str],
+    path: str,
+    chunk_ids: List[str],
+    chunk_embeddings,
+    chunks: List[str],
+    chunk_complements: Optional[List[str]],
+    chunk_hashes: List[str],
+    replace: bool,
+    removed_chunk_ids: Optional[list],
+):
+    workspace_id = workspace["workspace_id"]
+    engine = workspace["engine"]
 
     if engine == "aurora":
-        result = genai_core.aurora.chunks.add_chunks_aurora(
+        return genai_core.aurora.chunks.add_chunks_aurora(
             workspace_id=workspace_id,
-            document_id=document_id,
+            document_id=document["document_id"],
             document_sub_id=document_sub_id,
-            document_type=document_type,
-            document_sub_type=document_sub_type,
+            document_type=document["document_type"],
+            document_sub_type=document["document_sub_type"],
             path=path,
-            title=title,
+            title=document["title"],
             chunk_ids=chunk_ids,
             chunk_embeddings=chunk_embeddings,
             chunks=chunks,
             chunk_complements=chunk_complements,
             replace=replace,
+            chunk_hashes=chunk_hashes,
+            removed_chunk_ids=removed_chunk_ids,
         )
     elif engine == "opensearch":
-        result = genai_core.opensearch.chunks.add_chunks_open_search(
+        return genai_core.opensearch.chunks.add_chunks_open_search(
             workspace_id=workspace_id,
-            document_id=document_id,
+            document_id=document["document_id"],
             document_sub_id=document_sub_id,
-            document_type=document_type,
-            document_sub_type=document_sub_type,
+            document_type=document["document_type"],
+            document_sub_type=document["document_sub_type"],
             path=path,
-            title=title,
+            title=document["title"],
             chunk_ids=chunk_ids,
             chunk_embeddings=chunk_embeddings,
             chunks=chunks,
             chunk_complements=chunk_complements,
             replace=replace,
+            quantization=workspace.get("quantization", "none"),
+            chunk_hashes=chunk_hashes,
+            removed_chunk_ids=removed_chunk_ids,
         )
-    else:
-        raise CommonError("Engine not supported")
 
-    added_vectors = result["added_vectors"]
-    genai_core.documents.set_document_vectors(
-        workspace_id, document_id, added_vectors, replace=replace
-    )
+    raise CommonError("Engine not supported")
+
+
+# Every stage runs in its own thread, connected by bounded queues
+def _run_pipeline(
+    items: Iterable, stages: List[Tuple[str, Callable]], queue_size: int = 2
+):
+    stats = {name: {"batches": 0, "seconds": 0.0} for name, _ in stages}
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    results = []
+    errors = []
+    done = object()
+
+    def worker(idx: int):
+        name, function = stages[idx]
+        output = queues[idx + 1] if idx + 1 < len(stages) else None
+
+        while True:
+            item = queues[idx].get()
+            if item is done:
+                break
+            if errors:
+                # Keep draining so that the stages before do not block
+                continue
+
+            start = time.perf_counter()
+            try:
+                item = function(item)
+            except Exception as error:
+                errors.append(error)
+                continue
+
+            stats[name]["batches"] += 1
+            stats[name]["seconds"] += time.perf_counter() - start
+
+            if output is not None:
+                output.put(item)
+            else:
+                results.append(item)
+
+        if output is not None:
+            output.put(done)
+
+    threads = [
+        threading.Thread(target=worker, args=(idx,), daemon=True)
+        for idx in range(len(stages))
+    ]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    for item in items:
+        if errors:
+            break
+
+        queues[0].put(item)
+
+    queues[0].put(done)
+    for thread in threads:
+        thread.join()
+
+    stats["total_seconds"] = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    return results, stats
+
+
+# Only one window of chunks and embeddings is held in memory, the stored
+# chunk hashes are matched across all windows
+def add_chunks_stream(
+    replace: bool,
+    workspace: dict,
+    document: dict,
+    document_sub_id: Optional[str],
+    chunks: Iterable[str],
+    path: Optional[str] = None,
+    window_size: int = STREAM_WINDOW_SIZE,
+):
+    existing_chunks = None
+    if replace:
+        existing_chunks = get_chunk_hashes(workspace, document["document_id"])
+
+    window = []
+    first = True
+    for chunk in chunks:
+        window.append(chunk)
+
+        if len(window) >= window_size:
+            add_chunks(
+                replace=replace and first,
+                workspace=workspace,
+                document=document,
+                document_sub_id=document_sub_id,
+                chunks=window,
+                chunk_complements=None,
+                path=path,
+                existing_chunks=existing_chunks,
+            )
+            first = False
+            window = []
+
+    if window or first:
+        add_chunks(
+            replace=replace and first,
+            workspace=workspace,
+            document=document,
+            document_sub_id=document_sub_id,
+            chunks=window,
+            chunk_complements=None,
+            path=path,
+            existing_chunks=existing_chunks,
+        )
+
+    if existing_chunks:
+        removed_chunk_ids = []
+        for chunk_ids in existing_chunks.values():
+            removed_chunk_ids.extend(chunk_ids)
+
+        remove_chunks(workspace, removed_chunk_ids)
+        remove_chunks_from_s3(
+            workspace["workspace_id"], document["document_id"], removed_chunk_ids
+        )
+
+
+def get_chunk_hash(chunk: str, chunk_complement: Optional[str] = None) -> str:
+    value = chunk if chunk_complement is None else f"{chunk}\x00{chunk_complement}"
+
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def get_chunk_hashes(workspace: dict, document_id: str) -> Dict[Optional[str], list]:
+    workspace_id = workspace["workspace_id"]
+    engine = workspace["engine"]
+
+    if engine == "aurora":
+        return genai_core.aurora.chunks.get_chunk_hashes_aurora(
+            workspace_id, document_id
+        )
+    elif engine == "opensearch":
+        return genai_core.opensearch.chunks.get_chunk_hashes_open_search(
+            workspace_id, document_id
+        )
+
+    raise CommonError("Engine not supported")
+
+
+def remove_chunks(workspace: dict, chunk_ids: list):
+    workspace_id = workspace["workspace_id"]
+    engine = workspace["engine"]
+
+    if engine == "aurora":
+        return genai_core.aurora.chunks.remove_chunks_aurora(workspace_id, chunk_ids)
+    elif engine == "opensearch":
+        return genai_core.opensearch.chunks.remove_chunks_open_search(
+            workspace_id, chunk_ids
+        )
+
+    raise CommonError("Engine not supported")
+
+
+# Matched chunks are taken out of existing_chunks
+def _match_chunk_hashes(
+    chunk_hashes: List[str], existing_chunks: Dict[Optional[str], list]
+) -> List[int]:
+    new_indices = []
+    for idx, chunk_hash in enumerate(chunk_hashes):
+        chunk_ids = existing_chunks.get(chunk_hash)
+        if chunk_ids:
+            chunk_ids.pop()
+            if not chunk_ids:
+                del existing_chunks[chunk_hash]
+        else:
+            new_indices.append(idx)
+
+    return new_indices
 
 
 def split_content(workspace: dict, content: str):
+    text_splitter = _get_text_splitter(workspace)
+
+    text_data = text_splitter.split_text(content)
+    text_data = [text.replace("\x00", "\uFFFD") for text in text_data]
+
+    return text_data
+
+
+# Memory is bounded by read_size and not by the document
+def split_content_stream(
+    workspace: dict,
+    stream: Union[TextIO, Iterable[str]],
+    read_size: int = STREAM_READ_SIZE,
+) -> Iterator[str]:
+    text_splitter = _get_text_splitter(workspace)
+
+    carry = ""
+    for block in _read_blocks(stream, read_size):
+        buffer = carry + block
+        text_data = text_splitter.split_text(buffer)
+        if not text_data:
+            carry = ""
+            continue
+
+        # The last chunk may continue in the next block, split it again
+        # together with the next block. It overlaps the chunk before it,
+        # so the configured overlap is kept across block boundaries.
+        last = text_data.pop()
+        offset = buffer.rfind(last)
+        carry = buffer[offset:] if offset >= 0 else last
+
+        for text in text_data:
+            yield text.replace("\x00", "\uFFFD")
+
+    if carry:
+        for text in text_splitter.split_text(carry):
+            yield text.replace("\x00", "\uFFFD")
+
+
+def _get_text_splitter(workspace: dict):
     chunking_strategy = workspace["chunking_strategy"]
     chunk_size = workspace["chunk_size"]
     chunk_overlap = workspace["chunk_overlap"]
 
     if chunking_strategy == "recursive":
-        text_splitter = RecursiveCharacterTextSplitter(
+        return RecursiveCharacterTextSplitter(
             chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
         )
+    elif chunking_strategy == "token":
+        # Chunk size and overlap are measured in embeddings model tokens
+        length_function = genai_core.tokenizers.get_token_counter(
+            workspace["embeddings_model_provider"], workspace["embeddings_model_name"]
+        )
 
-        text_data = text_splitter.split_text(content)
-        text_data = [text.replace("\x00", "\uFFFD") for text in text_data]
-
-        return text_data
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function,
+        )
 
     raise CommonError("Chunking strategy not supported")
 
 
+def _read_blocks(stream: Union[TextIO, Iterable[str]], read_size: int):
+    if hasattr(stream, "read"):
+        while True:
+            block = stream.read(read_size)
+            if not block:
+                break
+
+            yield block
+    else:
+        yield from stream
+
+
+# One JSON Lines pack and an index of byte ranges, two requests in total
 def store_chunks_on_s3(
     workspace_id: str,
     document_id: str,
@@ -110,11 +483,161 @@ def store_chunks_on_s3(
     chunk_ids: List[str],
     chunks: List[str],
 ):
-    for chunk_id, chunk in zip(chunk_ids, chunks):
-        path = f"{workspace_id}/{document_id}/chunks/{chunk_id}.txt"
-        if document_sub_id:
-            path = (
-                f"{workspace_id}/{document_id}/{document_sub_id}/chunks/{chunk_id}.txt"
+    if not chunks:
+        return
+
+    prefix = _get_chunks_prefix(workspace_id, document_id, document_sub_id)
+    _put_chunks_pack(prefix, chunk_ids, chunks)
+
+
+# Chunks stored as one object each before packing are read as they are
+def read_chunks_from_s3(
+    workspace_id: str,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_ids: List[str],
+) -> Dict[str, str]:
+    prefix = _get_chunks_prefix(workspace_id, document_id, document_sub_id)
+    missing = set(str(chunk_id) for chunk_id in chunk_ids)
+    ret_value = {}
+
+    bucket = s3.Bucket(PROCESSING_BUCKET_NAME)
+    for item in bucket.objects.filter(Prefix=prefix):
+        if not missing:
+            break
+        if not item.key.endswith(CHUNKS_INDEX_SUFFIX):
+            continue
+
+        response = s3.Object(PROCESSING_BUCKET_NAME, item.key).get()
+        index = json.loads(response["Body"].read())
+        ranges = {
+            chunk_id: index["chunks"][chunk_id]
+            for chunk_id in missing
+            if chunk_id in index["chunks"]
+        }
+        if not ranges:
+            continue
+
+        start = min(offset for offset, _ in ranges.values())
+        end = max(offset + length for offset, length in ranges.values())
+        pack_key = item.key[: -len(CHUNKS_INDEX_SUFFIX)] + CHUNKS_PACK_SUFFIX
+        data = (
+            s3.Object(PROCESSING_BUCKET_NAME, pack_key)
+            .get(Range=f"bytes={start}-{end - 1}")["Body"]
+            .read()
+        )
+
+        for chunk_id, (offset, length) in ranges.items():
+            line = data[offset - start : offset - start + length]
+            ret_value[chunk_id] = json.loads(line)["content"]
+            missing.discard(chunk_id)
+
+    for chunk_id in missing:
+        key = f"{prefix}{chunk_id}.txt"
+        if genai_core.utils.files.file_exists(PROCESSING_BUCKET_NAME, key):
+            response = s3.Object(PROCESSING_BUCKET_NAME, key).get()
+            ret_value[chunk_id] = response["Body"].read().decode("utf-8")
+
+    return ret_value
+
+
+# Packs still holding a live chunk are kept, their removed chunks are
+# never read again
+def remove_chunks_from_s3(workspace_id: str, document_id: str, chunk_ids: list):
+    removed = set(str(chunk_id) for chunk_id in chunk_ids)
+    bucket = s3.Bucket(PROCESSING_BUCKET_NAME)
+
+    keys = []
+    for item in bucket.objects.filter(Prefix=f"{workspace_id}/{document_id}/"):
+        chunks_prefix, _, name = item.key.rpartition("/")
+        if not chunks_prefix.endswith("/chunks"):
+            continue
+
+        if name.endswith(".txt") and name[: -len(".txt")] in removed:
+            keys.append(item.key)
+        elif name.endswith(CHUNKS_INDEX_SUFFIX):
+            response = s3.Object(PROCESSING_BUCKET_NAME, item.key).get()
+            index = json.loads(response["Body"].read())
+            if removed.issuperset(index["chunks"]):
+                pack_key = item.key[: -len(CHUNKS_INDEX_SUFFIX)] + CHUNKS_PACK_SUFFIX
+                # The index goes first, readers never see a pack without data
+                keys.extend([item.key, pack_key])
+
+    # DeleteObjects accepts at most 1000 keys
+    for i in range(0, len(keys), 1000):
+        bucket.delete_objects(
+            Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]]}
+        )
+
+    return len(keys)
+
+
+# Safe to run again, chunks already packed are left as they are
+def migrate_chunks_on_s3(workspace_id: str, document_id: Optional[str] = None):
+    prefix = f"{workspace_id}/{document_id}/" if document_id else f"{workspace_id}/"
+    bucket = s3.Bucket(PROCESSING_BUCKET_NAME)
+
+    legacy_keys = {}
+    for item in bucket.objects.filter(Prefix=prefix):
+        chunks_prefix, _, name = item.key.rpartition("/")
+        if chunks_prefix.endswith("/chunks") and name.endswith(".txt"):
+            legacy_keys.setdefault(f"{chunks_prefix}/", []).append(item.key)
+
+    migrated = 0
+    for chunks_prefix, keys in legacy_keys.items():
+        chunk_ids = [key[len(chunks_prefix) : -len(".txt")] for key in keys]
+        chunks = [
+            s3.Object(PROCESSING_BUCKET_NAME, key).get()["Body"].read().decode("utf-8")
+            for key in keys
+        ]
+
+        _put_chunks_pack(chunks_prefix, chunk_ids, chunks)
+
+        # workspace_id/document_id[/document_sub_id]/chunks/
+        ids = chunks_prefix.split("/")[:-2]
+        packed = read_chunks_from_s3(
+            ids[0], ids[1], ids[2] if len(ids) > 2 else None, chunk_ids
+        )
+        if packed != dict(zip(chunk_ids, chunks)):
+            raise CommonError(f"Packed chunks do not match in {chunks_prefix}")
+
+        # DeleteObjects accepts at most 1000 keys
+        for i in range(0, len(keys), 1000):
+            bucket.delete_objects(
+                Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]]}
             )
 
-        s3.Object(PROCESSING_BUCKET_NAME, path).put(Body=chunk)
+        migrated += len(keys)
+        logger.info(f"Packed {len(keys)} chunks in {chunks_prefix}")
+
+    return migrated
+
+
+def _get_chunks_prefix(
+    workspace_id: str, document_id: str, document_sub_id: Optional[str]
+):
+    if document_sub_id:
+        return f"{workspace_id}/{document_id}/{document_sub_id}/chunks/"
+
+    return f"{workspace_id}/{document_id}/chunks/"
+
+
+def _put_chunks_pack(prefix: str, chunk_ids: List[str], chunks: List[str]):
+    pack_id = uuid.uuid4()
+    body = bytearray()
+    index = {}
+
+    for chunk_id, chunk in zip(chunk_ids, chunks):
+        line = json.dumps({"chunk_id": str(chunk_id), "content": chunk}) + "\n"
+        data = line.encode("utf-8")
+        index[str(chunk_id)] = [len(body), len(data)]
+        body.extend(data)
+
+    s3.Object(PROCESSING_BUCKET_NAME, f"{prefix}{pack_id}{CHUNKS_PACK_SUFFIX}").put(
+        Body=bytes(body), ContentType="application/x-ndjson"
+    )
+    # The index is written last, readers only see complete packs
+    s3.Object(PROCESSING_BUCKET_NAME, f"{prefix}{pack_id}{CHUNKS_INDEX_SUFFIX}").put(
+        Body=json.dumps({"version": 1, "chunks": index}),
+        ContentType="application/json",
+    )
@@ -432,7 +432,10 @@ def _process_document_kendra(
             "DocumentId": document_id,
             "Attributes": {
                 "workspace_id": workspace_id,
+                "document_id": document_id,
                 "document_type": document_type,
+                # Kendra reads ISO 8601 dates without fractional seconds
+                "_created_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
             },
         }
 
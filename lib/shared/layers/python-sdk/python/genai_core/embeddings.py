@@ -1,35 +1,140 @@
 import os
 import json
-import time
 import random
+import asyncio
 import botocore
 import numpy as np
+from aws_lambda_powertools import Logger
+from concurrent.futures import ThreadPoolExecutor
 from genai_core.types import EmbeddingsModel, CommonError, Provider, Task
 import genai_core.clients
 import genai_core.parameters
-from typing import List, Optional
+import genai_core.embeddings_cache
+import genai_core.embeddings_batching
+from typing import List, Optional, Union
 
 SAGEMAKER_RAG_MODELS_ENDPOINT = os.environ.get("SAGEMAKER_RAG_MODELS_ENDPOINT")
+EMBEDDINGS_DEFAULT_CONCURRENCY = int(
+    os.environ.get("EMBEDDINGS_DEFAULT_CONCURRENCY", 8)
+)
+EMBEDDINGS_MAX_RETRIES = 8
+
+THROTTLING_ERROR_CODES = [
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+]
+
+# boto3 clients are blocking, their calls run on this pool so that the
+# event loop can keep several requests in flight.
+executor = ThreadPoolExecutor(max_workers=32)
+logger = Logger()
 
 
 def generate_embeddings(
-    model: EmbeddingsModel, input: List[str], task: str = "store", batch_size: int = 50
-) -> List[List[float]]:
-    input = list(map(lambda x: x[:10000], input))
+    model: EmbeddingsModel,
+    input: List[str],
+    task: str = "store",
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    as_array: bool = False,
+    dimensions: Optional[int] = None,
+) -> Union[List[List[float]], np.ndarray]:
+    return _run_sync(
+        agenerate_embeddings(
+            model,
+            input,
+            task,
+            batch_size,
+            use_cache=use_cache,
+            as_array=as_array,
+            dimensions=dimensions,
+        )
+    )
+
+
+# Embeddings are truncated to the requested dimensions and normalized again
+async def agenerate_embeddings(
+    model: EmbeddingsModel,
+    input: List[str],
+    task: str = "store",
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    as_array: bool = False,
+    dimensions: Optional[int] = None,
+) -> Union[List[List[float]], np.ndarray]:
+    dimensions = int(dimensions) if dimensions else model.dimensions
+    if dimensions > model.dimensions:
+        raise CommonError(
+            f"Embeddings model {model.name} has only {model.dimensions} dimensions"
+        )
+
+    limits = genai_core.embeddings_batching.get_batch_limits(model)
+    input = list(map(lambda x: x[: limits.max_chars], input))
 
-    ret_value = []
-    batch_split = [input[i : i + batch_size] for i in range(0, len(input), batch_size)]
+    if use_cache:
+        cache = genai_core.embeddings_cache.get_embeddings_cache()
+    else:
+        cache = genai_core.embeddings_cache.NoopEmbeddingsCache()
+    keys = [
+        genai_core.embeddings_cache.get_cache_key(model, task, value) for value in input
+    ]
+    cached = await _run_blocking(cache.get_many, keys)
+
+    missing = {}
+    for key, value in zip(keys, input):
+        if key not in cached and key not in missing:
+            missing[key] = value
+
+    missing_keys = list(missing.keys())
+    missing_input = list(missing.values())
+    batch_split = genai_core.embeddings_batching.plan_batches(
+        model, missing_input, batch_size
+    )
 
-    for batch in batch_split:
+    # Bounds the number of provider requests in flight for this call
+    semaphore = asyncio.Semaphore(model.concurrency or EMBEDDINGS_DEFAULT_CONCURRENCY)
+    # One client for all the batches of this call
+    bedrock = None
+    if model.provider == Provider.BEDROCK.value and batch_split:
+        bedrock = await _run_blocking(genai_core.clients.get_bedrock_client)
+
+    async def run_batch(batch_idx: List[int]):
+        batch = [missing_input[idx] for idx in batch_idx]
         if model.provider == Provider.OPENAI.value:
-            ret_value.extend(_generate_embeddings_openai(model, batch))
+            return await _agenerate_embeddings_openai(model, batch, semaphore)
         elif model.provider == Provider.BEDROCK.value:
-            ret_value.extend(_generate_embeddings_bedrock(model, batch, task))
+            return await _agenerate_embeddings_bedrock(
+                model, batch, task, bedrock, semaphore
+            )
         elif model.provider == Provider.SAGEMAKER.value:
-            ret_value.extend(_generate_embeddings_sagemaker(model, batch))
+            return await _agenerate_embeddings_sagemaker(model, batch, semaphore)
         else:
             raise CommonError(f"Unknown provider: {model.provider}")
 
+    results = await asyncio.gather(*[run_batch(batch) for batch in batch_split])
+
+    generated = {}
+    for batch_idx, embeddings in zip(batch_split, results):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for idx, embedding in zip(batch_idx, embeddings):
+            generated[missing_keys[idx]] = embedding
+
+    await _run_blocking(cache.put_many, generated)
+    cached.update(generated)
+
+    ret_value = np.empty((len(keys), dimensions), dtype=np.float32)
+    for idx, key in enumerate(keys):
+        ret_value[idx] = cached[key][:dimensions]
+
+    if dimensions < model.dimensions and len(keys) > 0:
+        norms = np.linalg.norm(ret_value, axis=1, keepdims=True)
+        ret_value /= np.maximum(norms, np.finfo(np.float32).tiny)
+
+    if not as_array:
+        ret_value = ret_value.tolist()
+
     return ret_value
 
 
@@ -54,90 +159,137 @@ def get_embeddings_model(provider: Provider, name: str) -> Optional[EmbeddingsMo
     return None
 
 
-def _generate_embeddings_openai(model: EmbeddingsModel, input: List[str]):
-    openai = genai_core.clients.get_openai_client()
+async def _agenerate_embeddings_openai(
+    model: EmbeddingsModel, input: List[str], semaphore: asyncio.Semaphore
+):
+    openai = await _run_blocking(genai_core.clients.get_openai_client)
 
     if not openai:
         raise CommonError("OpenAI API is not available. Please set OPENAI_API_KEY.")
 
-    data = openai.Embedding.create(input=input, model=model.name)["data"]
+    async with semaphore:
+        response = await openai.Embedding.acreate(input=input, model=model.name)
+
+    data = response["data"]
     ret_value = list(map(lambda x: x["embedding"], data))
 
     return ret_value
 
 
-def _generate_embeddings_bedrock(model: EmbeddingsModel, input: List[str], task: Task):
-    bedrock = genai_core.clients.get_bedrock_client()
-
+async def _agenerate_embeddings_bedrock(
+    model: EmbeddingsModel,
+    input: List[str],
+    task: Task,
+    bedrock,
+    semaphore: asyncio.Semaphore,
+):
     if not bedrock:
         raise CommonError("Bedrock is not enabled.")
 
     model_provider = model.name.split(".")[0]
     if model_provider == Provider.AMAZON.value:
-        return _generate_embeddings_amazon(model, input, bedrock)
+        return await _agenerate_embeddings_amazon(model, input, bedrock, semaphore)
     elif model_provider == Provider.COHERE.value:
-        return _generate_embeddings_cohere(model, input, task, bedrock)
+        return await _agenerate_embeddings_cohere(
+            model, input, task, bedrock, semaphore
+        )
     else:
         raise CommonError(f'Unknown embeddings provider "{model_provider}"')
 
 
-def _generate_embeddings_amazon(model: EmbeddingsModel, input: List[str], bedrock):
-    ret_value = []
-    for value in input:
+async def _agenerate_embeddings_amazon(
+    model: EmbeddingsModel, input: List[str], bedrock, semaphore: asyncio.Semaphore
+):
+    # Titan only accepts one text per request, fan the requests out
+    # and keep the results in the same order as the input.
+    async def invoke(value: str):
         body = json.dumps({"inputText": value})
-        response = bedrock.invoke_model(
-            body=body,
-            modelId=model.name,
-            accept="application/json",
-            contentType="application/json",
+        response_body = await _ainvoke_bedrock_with_backoff(
+            bedrock, model, body, semaphore
         )
-        response_body = json.loads(response.get("body").read())
-        embedding = response_body.get("embedding")
 
-        ret_value.append(embedding)
+        return response_body.get("embedding")
+
+    ret_value = await asyncio.gather(*[invoke(value) for value in input])
 
-    ret_value = np.array(ret_value)
-    ret_value = ret_value / np.linalg.norm(ret_value, axis=1, keepdims=True)
-    ret_value = ret_value.tolist()
+    ret_value = np.array(ret_value, dtype=np.float32)
+    ret_value /= np.linalg.norm(ret_value, axis=1, keepdims=True)
     return ret_value
 
 
-def _generate_embeddings_cohere(
-    model: EmbeddingsModel, input: List[str], task: Task, bedrock
+async def _agenerate_embeddings_cohere(
+    model: EmbeddingsModel,
+    input: List[str],
+    task: Task,
+    bedrock,
+    semaphore: asyncio.Semaphore,
 ):
     input_type = (
         Task.SEARCH_QUERY.value if task == Task.RETRIEVE else Task.SEARCH_DOCUMENT.value
     )
     body = json.dumps({"texts": input, "input_type": input_type})
-    response = bedrock.invoke_model(
-        body=body,
-        modelId=model.name,
-        accept="application/json",
-        contentType="application/json",
-    )
-    response_body = json.loads(response.get("body").read())
+    response_body = await _ainvoke_bedrock_with_backoff(bedrock, model, body, semaphore)
     embeddings = response_body.get("embeddings")
 
     return embeddings
 
 
-def _generate_embeddings_sagemaker(model: EmbeddingsModel, input: List[str]):
-    client = genai_core.clients.get_sagemaker_client()
+async def _ainvoke_bedrock_with_backoff(
+    bedrock, model: EmbeddingsModel, body: str, semaphore: asyncio.Semaphore
+):
+    def invoke():
+        response = bedrock.invoke_model(
+            body=body,
+            modelId=model.name,
+            accept="application/json",
+            contentType="application/json",
+        )
 
-    max_retries = 5
-    for attempt in range(max_retries):
+        return json.loads(response.get("body").read())
+
+    for attempt in range(EMBEDDINGS_MAX_RETRIES):
         try:
-            response = client.invoke_endpoint(
-                EndpointName=SAGEMAKER_RAG_MODELS_ENDPOINT,
-                ContentType="application/json",
-                Body=json.dumps(
-                    {"type": "embeddings", "model": model.name, "input": input}
-                ),
-            )
+            async with semaphore:
+                return await _run_blocking(invoke)
+        except botocore.exceptions.ClientError as error:
+            error_code = error.response.get("Error", {}).get("Code")
+            if (
+                error_code not in THROTTLING_ERROR_CODES
+                or attempt == EMBEDDINGS_MAX_RETRIES - 1
+            ):
+                logger.error(
+                    f"Bedrock embeddings failed after {attempt + 1} attempts "
+                    f"({error_code})"
+                )
+                raise error
+
+            # Exponential backoff with full jitter, capped at 10 seconds
+            delay = random.uniform(0, min(10, 0.25 * (2**attempt)))
+            logger.warning(f"Attempt {attempt + 1} throttled ({error_code}), retrying")
+            await asyncio.sleep(delay)
+
+
+async def _agenerate_embeddings_sagemaker(
+    model: EmbeddingsModel, input: List[str], semaphore: asyncio.Semaphore
+):
+    client = await _run_blocking(genai_core.clients.get_sagemaker_client)
+
+    def invoke():
+        response = client.invoke_endpoint(
+            EndpointName=SAGEMAKER_RAG_MODELS_ENDPOINT,
+            ContentType="application/json",
+            Body=json.dumps(
+                {"type": "embeddings", "model": model.name, "input": input}
+            ),
+        )
 
-            ret_value = json.loads(response["Body"].read().decode())
+        return json.loads(response["Body"].read().decode())
 
-            return ret_value
+    max_retries = 5
+    for attempt in range(max_retries):
+        try:
+            async with semaphore:
+                return await _run_blocking(invoke)
         except botocore.exceptions.ClientError as error:
             # Check if the error is due to a 500 server error
             error_code = error.response.get("Error", {}).get("Code")
@@ -146,8 +298,25 @@ def _generate_embeddings_sagemaker(model: EmbeddingsModel, input: List[str]):
                 or error_code == "InternalServerError"
             ):
                 print(f"Attempt {attempt + 1} failed with a 500 error.")
-                time.sleep(random.uniform(0.3, 1.5))
+                await asyncio.sleep(random.uniform(0.3, 1.5))
                 continue
             else:
                 # If the exception was due to another reason, raise it.
                 raise error
+
+
+async def _run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(executor, func, *args)
+
+
+def _run_sync(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    # Called from a running event loop, drive the coroutine on a separate thread
+    with ThreadPoolExecutor(max_workers=1) as loop_executor:
+        return loop_executor.submit(asyncio.run, coroutine).result()
@@ -0,0 +1,114 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from genai_core.types import EmbeddingsModel, Provider
+
+# Rough average for the tokenizers used by the supported embeddings models
+CHARS_PER_TOKEN = 4
+
+
+class BatchLimits(BaseModel):
+    # Maximum number of texts in a single request
+    max_texts: int
+    # Maximum number of estimated tokens in a single request
+    max_tokens: int
+    # Maximum number of characters kept for a single text, never below
+    # max_text_tokens * CHARS_PER_TOKEN so that token chunks are kept whole
+    max_chars: int = 10000
+    # Maximum number of tokens the model reads from a single text
+    max_text_tokens: Optional[int] = None
+    # The endpoint pads every text to the longest one in the request
+    padded: bool = False
+
+
+SAGEMAKER_LIMITS = BatchLimits(
+    max_texts=64, max_tokens=8192, max_text_tokens=512, padded=True
+)
+OPENAI_LIMITS = BatchLimits(
+    max_texts=2048,
+    max_tokens=250000,
+    max_chars=8191 * CHARS_PER_TOKEN,
+    max_text_tokens=8191,
+)
+COHERE_LIMITS = BatchLimits(
+    max_texts=96, max_tokens=96 * 512, max_chars=2048, max_text_tokens=512
+)
+# Titan accepts one text per request, batches are fanned out concurrently
+TITAN_LIMITS = BatchLimits(
+    max_texts=256,
+    max_tokens=256 * 8192,
+    max_chars=8192 * CHARS_PER_TOKEN,
+    max_text_tokens=8192,
+)
+DEFAULT_LIMITS = BatchLimits(max_texts=50, max_tokens=50 * 2500)
+
+
+def get_batch_limits(model: EmbeddingsModel) -> BatchLimits:
+    if model.provider == Provider.SAGEMAKER.value:
+        return SAGEMAKER_LIMITS
+    elif model.provider == Provider.OPENAI.value:
+        return OPENAI_LIMITS
+    elif model.provider == Provider.BEDROCK.value:
+        model_provider = model.name.split(".")[0]
+        if model_provider == Provider.COHERE.value:
+            return COHERE_LIMITS
+        elif model_provider == Provider.AMAZON.value:
+            return TITAN_LIMITS
+
+    return DEFAULT_LIMITS
+
+
+# Larger token chunks would lose their end, either to the model input limit
+# or to the max_chars cut before every request
+def get_max_chunk_tokens(model: EmbeddingsModel) -> int:
+    limits = get_batch_limits(model)
+    max_tokens = limits.max_chars // CHARS_PER_TOKEN
+    if limits.max_text_tokens:
+        max_tokens = min(max_tokens, limits.max_text_tokens)
+
+    return max_tokens
+
+
+def estimate_tokens(text: str, limits: BatchLimits) -> int:
+    tokens = len(text) // CHARS_PER_TOKEN + 1
+    if limits.max_text_tokens:
+        tokens = min(tokens, limits.max_text_tokens)
+
+    return tokens
+
+
+def plan_batches(
+    model: EmbeddingsModel, input: List[str], max_texts: Optional[int] = None
+) -> List[List[int]]:
+    """Returns the input indices of every request, similar lengths together"""
+    limits = get_batch_limits(model)
+    batch_max_texts = limits.max_texts
+    if max_texts:
+        batch_max_texts = min(batch_max_texts, max_texts)
+
+    tokens = [estimate_tokens(text, limits) for text in input]
+    order = sorted(range(len(input)), key=lambda idx: tokens[idx])
+
+    batches = []
+    current = []
+    current_tokens = 0
+    for idx in order:
+        text_tokens = tokens[idx]
+        next_tokens = current_tokens + text_tokens
+        if limits.padded:
+            # Ascending order, so this text sets the padded length
+            next_tokens = text_tokens * (len(current) + 1)
+
+        if current and (
+            len(current) >= batch_max_texts or next_tokens > limits.max_tokens
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+
+        current.append(idx)
+        current_tokens += text_tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
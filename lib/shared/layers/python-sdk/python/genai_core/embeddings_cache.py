@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import boto3
+import botocore
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from genai_core.types import CommonError, EmbeddingsModel, Task
+
+EMBEDDINGS_CACHE = os.environ.get("EMBEDDINGS_CACHE", "memory")
+EMBEDDINGS_CACHE_SIZE = int(os.environ.get("EMBEDDINGS_CACHE_SIZE", 1024))
+EMBEDDINGS_CACHE_PATH = os.environ.get(
+    "EMBEDDINGS_CACHE_PATH", "/tmp/embeddings-cache.sqlite3"
+)
+EMBEDDINGS_CACHE_TABLE_NAME = os.environ.get("EMBEDDINGS_CACHE_TABLE_NAME")
+EMBEDDINGS_CACHE_BUCKET_NAME = os.environ.get("EMBEDDINGS_CACHE_BUCKET_NAME")
+EMBEDDINGS_CACHE_PREFIX = "embeddings-cache"
+
+
+def get_cache_key(model: EmbeddingsModel, task, text: str) -> str:
+    task = task.value if isinstance(task, Task) else task
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    return f"{model.provider}/{model.name}/{task}/{digest}"
+
+
+class EmbeddingsCache(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = self._get_many(keys)
+
+        hits = sum(1 for key in keys if key in found)
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if items:
+            self._put_many(
+                {
+                    key: np.asarray(value, dtype=np.float32)
+                    for key, value in items.items()
+                }
+            )
+
+    def get_stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        raise NotImplementedError()
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        raise NotImplementedError()
+
+
+class NoopEmbeddingsCache(EmbeddingsCache):
+    def _get_many(self, keys: List[str]):
+        return {}
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        pass
+
+
+class MemoryEmbeddingsCache(EmbeddingsCache):
+    def __init__(self, max_size: int = EMBEDDINGS_CACHE_SIZE):
+        super().__init__()
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_many(self, keys: List[str]):
+        ret_value = {}
+        with self._lock:
+            for key in keys:
+                value = self._items.get(key)
+                if value is not None:
+                    self._items.move_to_end(key)
+                    ret_value[key] = value
+
+        return ret_value
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, value in items.items():
+                # Copy so that cached rows do not keep whole batches alive
+                self._items[key] = value.copy()
+                self._items.move_to_end(key)
+
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class SqliteEmbeddingsCache(EmbeddingsCache):
+    def __init__(self, path: str = EMBEDDINGS_CACHE_PATH):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, value BLOB)"
+        )
+        self._connection.commit()
+
+    def _get_many(self, keys: List[str]):
+        ret_value = {}
+        # Stay below the default SQLite host parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i : i + 500]
+            placeholders = ",".join(["?"] * len(batch))
+            with self._lock:
+                rows = self._connection.execute(
+                    f"SELECT key, value FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+
+            for key, value in rows:
+                ret_value[key] = np.frombuffer(value, dtype=np.float32)
+
+        return ret_value
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, value) VALUES (?, ?)",
+                [(key, value.tobytes()) for key, value in items.items()],
+            )
+            self._connection.commit()
+
+
+class DynamoDBEmbeddingsCache(EmbeddingsCache):
+    def __init__(self, table=None, table_name: str = EMBEDDINGS_CACHE_TABLE_NAME):
+        super().__init__()
+        if table is None:
+            table = boto3.resource("dynamodb").Table(table_name)
+
+        self.table = table
+
+    def _get_many(self, keys: List[str]):
+        ret_value = {}
+        # BatchGetItem accepts at most 100 keys and rejects duplicates
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), 100):
+            request_keys = [{"key": key} for key in unique_keys[i : i + 100]]
+            while request_keys:
+                response = self.table.meta.client.batch_get_item(
+                    RequestItems={self.table.name: {"Keys": request_keys}}
+                )
+
+                for item in response.get("Responses", {}).get(self.table.name, []):
+                    ret_value[item["key"]] = np.frombuffer(
+                        bytes(item["value"]), dtype=np.float32
+                    )
+
+                unprocessed = response.get("UnprocessedKeys", {}).get(self.table.name)
+                request_keys = unprocessed["Keys"] if unprocessed else []
+
+        return ret_value
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        with self.table.batch_writer(overwrite_by_pkeys=["key"]) as batch:
+            for key, value in items.items():
+                batch.put_item(Item={"key": key, "value": value.tobytes()})
+
+
+class S3EmbeddingsCache(EmbeddingsCache):
+    def __init__(self, client=None, bucket_name: str = EMBEDDINGS_CACHE_BUCKET_NAME):
+        super().__init__()
+        self.client = client if client is not None else boto3.client("s3")
+        self.bucket_name = bucket_name
+
+    def _get_many(self, keys: List[str]):
+        ret_value = {}
+        for key in keys:
+            try:
+                response = self.client.get_object(
+                    Bucket=self.bucket_name, Key=f"{EMBEDDINGS_CACHE_PREFIX}/{key}"
+                )
+            except botocore.exceptions.ClientError as error:
+                error_code = error.response.get("Error", {}).get("Code")
+                if error_code in ["NoSuchKey", "404"]:
+                    continue
+
+                raise error
+
+            ret_value[key] = np.frombuffer(response["Body"].read(), dtype=np.float32)
+
+        return ret_value
+
+    def _put_many(self, items: Dict[str, np.ndarray]):
+        for key, value in items.items():
+            self.client.put_object(
+                Bucket=self.bucket_name,
+                Key=f"{EMBEDDINGS_CACHE_PREFIX}/{key}",
+                Body=value.tobytes(),
+            )
+
+
+_cache: Optional[EmbeddingsCache] = None
+
+
+def get_embeddings_cache() -> EmbeddingsCache:
+    global _cache
+
+    if _cache is None:
+        _cache = create_embeddings_cache(EMBEDDINGS_CACHE)
+
+    return _cache
+
+
+def set_embeddings_cache(cache: Optional[EmbeddingsCache]):
+    global _cache
+
+    _cache = cache
+
+
+def create_embeddings_cache(kind: str) -> EmbeddingsCache:
+    if kind == "memory":
+        return MemoryEmbeddingsCache()
+    elif kind == "sqlite":
+        return SqliteEmbeddingsCache()
+    elif kind == "dynamodb":
+        return DynamoDBEmbeddingsCache()
+    elif kind == "s3":
+        return S3EmbeddingsCache()
+    elif kind in ["none", "disabled", ""]:
+        return NoopEmbeddingsCache()
+
+    raise CommonError(f"Unknown embeddings cache: {kind}")
@@ -1,14 +1,19 @@
 import os
 import re
 import genai_core.types
-from typing import List
+from typing import List, Optional
 from .client import get_kendra_client_for_index
 
 s3_pattern = re.compile(r"(s3-|s3\.)?(.*)\.amazonaws\.com")
 
 
 def query_workspace_kendra(
-    workspace_id: str, workspace: dict, query: str, limit: int, full_response: bool
+    workspace_id: str,
+    workspace: dict,
+    query: str,
+    limit: int,
+    full_response: bool,
+    filters: Optional[genai_core.types.SemanticSearchFilters] = None,
 ):
     kendra_index_id = workspace.get("kendra_index_id")
     kendra_index_external = workspace.get("kendra_index_external", True)
@@ -22,26 +27,33 @@ def query_workspace_kendra(
     kendra = get_kendra_client_for_index(kendra_index_id)
     limit = max(1, min(100, limit))
 
-    if kendra_index_external or kendra_use_all_data:
-        result = kendra.retrieve(
-            IndexId=kendra_index_id, QueryText=query, PageSize=limit, PageNumber=1
-        )
-    else:
-        result = kendra.retrieve(
-            IndexId=kendra_index_id,
-            QueryText=query,
-            PageSize=limit,
-            PageNumber=1,
-            AttributeFilter={
+    attribute_filters = _get_attribute_filters(filters)
+    if not (kendra_index_external or kendra_use_all_data):
+        attribute_filters.append(
+            {
                 "EqualsTo": {
                     "Key": "workspace_id",
                     "Value": {
                         "StringValue": workspace_id,
                     },
                 }
-            },
+            }
         )
 
+    retrieve_args = {}
+    if len(attribute_filters) == 1:
+        retrieve_args["AttributeFilter"] = attribute_filters[0]
+    elif attribute_filters:
+        retrieve_args["AttributeFilter"] = {"AndAllFilters": attribute_filters}
+
+    result = kendra.retrieve(
+        IndexId=kendra_index_id,
+        QueryText=query,
+        PageSize=limit,
+        PageNumber=1,
+        **retrieve_args,
+    )
+
     items = result["ResultItems"]
     items = _convert_records("kendra", workspace_id, items)
 
@@ -53,6 +65,55 @@ def query_workspace_kendra(
     return ret_value
 
 
+def _get_attribute_filters(
+    filters: Optional[genai_core.types.SemanticSearchFilters],
+) -> List[dict]:
+    if filters is None:
+        return []
+
+    if filters.path_prefix:
+        raise genai_core.types.CommonError(
+            "Path prefix filters are not supported by Kendra workspaces"
+        )
+
+    attribute_filters = []
+    for key, values in [
+        ("document_type", filters.document_types),
+        ("document_id", filters.document_ids),
+    ]:
+        if values:
+            attribute_filters.append(
+                {
+                    "OrAllFilters": [
+                        {"EqualsTo": {"Key": key, "Value": {"StringValue": value}}}
+                        for value in values
+                    ]
+                }
+            )
+
+    # _created_at is a reserved attribute, set from the document metadata
+    if filters.created_after:
+        attribute_filters.append(
+            {
+                "GreaterThanOrEquals": {
+                    "Key": "_created_at",
+                    "Value": {"DateValue": filters.created_after},
+                }
+            }
+        )
+    if filters.created_before:
+        attribute_filters.append(
+            {
+                "LessThan": {
+                    "Key": "_created_at",
+                    "Value": {"DateValue": filters.created_before},
+                }
+            }
+        )
+
+    return attribute_filters
+
+
 def _convert_records(source: str, workspace_id: str, records: List[dict]):
     converted_records = []
     for record in records:
@@ -1,17 +1,26 @@
 import genai_core.semantic_search
-from typing import List
+from typing import List, Optional
 from langchain.callbacks.manager import CallbackManagerForRetrieverRun
 from langchain.schema import BaseRetriever, Document
 
 
 class WorkspaceRetriever(BaseRetriever):
     workspace_id: str
+    # Overrides the workspace k, probes and ef_search for this retriever
+    vector_search_params: Optional[dict] = None
+    # Restricts the documents searched, see SemanticSearchFilters
+    filters: Optional[dict] = None
 
     def _get_relevant_documents(
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
     ) -> List[Document]:
         result = genai_core.semantic_search.semantic_search(
-            self.workspace_id, query, limit=3, full_response=False
+            self.workspace_id,
+            query,
+            limit=3,
+            full_response=False,
+            vector_search_params=self.vector_search_params,
+            filters=self.filters,
         )
 
         return [self._get_document(item) for item in result.get("items", [])]
@@ -1,5 +1,20 @@
-from typing import List, Optional
+import os
+import numpy as np
+from datetime import datetime
+from opensearchpy import helpers
+from typing import Dict, List, Optional, Union
+from genai_core.types import CommonError
 from .client import get_open_search_client
+from .utils import quantize_int8
+
+# Bulk requests are bounded by both the number of chunks and the size of
+# the body, large chunks with high dimension vectors reach the size first
+OPEN_SEARCH_BULK_MAX_CHUNKS = int(os.environ.get("OPEN_SEARCH_BULK_MAX_CHUNKS", 500))
+OPEN_SEARCH_BULK_MAX_BYTES = int(
+    os.environ.get("OPEN_SEARCH_BULK_MAX_BYTES", 10 * 1024 * 1024)
+)
+# Chunks rejected with 429 are sent again, with exponential backoff
+OPEN_SEARCH_BULK_MAX_RETRIES = 3
 
 
 def add_chunks_open_search(
@@ -11,49 +26,99 @@ def add_chunks_open_search(
     path: Optional[str],
     title: Optional[str],
     chunk_ids: List[str],
-    chunk_embeddings: List[int],
+    chunk_embeddings: Union[List[List[float]], np.ndarray],
     chunks: List[str],
     chunk_complements: List[str],
     replace: bool,
+    quantization: str = "none",
+    chunk_hashes: Optional[List[str]] = None,
+    removed_chunk_ids: Optional[List[str]] = None,
 ):
     index_name = workspace_id.replace("-", "")
     complements_len = len(chunk_complements) if chunk_complements else 0
+    hashes_len = len(chunk_hashes) if chunk_hashes else 0
     removed_vectors = 0
 
     client = get_open_search_client()
+    # Matches the created_at mapping, read by the search filters
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-    if replace:
+    if removed_chunk_ids is not None:
+        # Incremental replace, only the chunks missing from the new
+        # content are removed
+        removed_vectors = remove_chunks_open_search(workspace_id, removed_chunk_ids)
+    elif replace:
         removed_vectors = clean_chunks_open_search(workspace_id, document_id)
 
-    for idx in range(len(chunk_ids)):
-        chunk_id = chunk_ids[idx]
-        content = chunks[idx]
-        content_complement = chunk_complements[idx] if idx < complements_len else None
+    def get_actions():
+        for idx in range(len(chunk_ids)):
+            content_complement = (
+                chunk_complements[idx] if idx < complements_len else None
+            )
+            content_hash = chunk_hashes[idx] if idx < hashes_len else None
+            # Convert one row at a time, the request body has to be JSON
+            content_embeddings = chunk_embeddings[idx]
+            if quantization == "int8":
+                content_embeddings = quantize_int8(content_embeddings)
+            elif isinstance(content_embeddings, np.ndarray):
+                content_embeddings = content_embeddings.tolist()
 
-        add_body = {
-            "chunk_id": chunk_id,
-            "workspace_id": workspace_id,
-            "document_id": document_id,
-            "document_sub_id": document_sub_id,
-            "document_type": document_type,
-            "document_sub_type": document_sub_type,
-            "path": path,
-            "title": title,
-            "content": content,
-            "content_complement": content_complement,
-            "content_embeddings": chunk_embeddings[idx],
-        }
+            yield {
+                "_index": index_name,
+                "_source": {
+                    "chunk_id": chunk_ids[idx],
+                    "workspace_id": workspace_id,
+                    "document_id": document_id,
+                    "document_sub_id": document_sub_id,
+                    "document_type": document_type,
+                    "document_sub_type": document_sub_type,
+                    "path": path,
+                    "title": title,
+                    "content": chunks[idx],
+                    "content_complement": content_complement,
+                    "content_hash": content_hash,
+                    "content_embeddings": content_embeddings,
+                    "created_at": created_at,
+                },
+            }
 
-        client.index(index=index_name, body=add_body)
+    added_vectors = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(
+        client,
+        get_actions(),
+        chunk_size=OPEN_SEARCH_BULK_MAX_CHUNKS,
+        max_chunk_bytes=OPEN_SEARCH_BULK_MAX_BYTES,
+        max_retries=OPEN_SEARCH_BULK_MAX_RETRIES,
+        raise_on_error=False,
+    ):
+        if ok:
+            added_vectors += 1
+        else:
+            errors.append(item)
 
-    return {"removed_vectors": removed_vectors, "added_vectors": len(chunk_ids)}
+    if errors:
+        for error in errors[:10]:
+            print(f"Failed to index chunk: {error}")
 
+        raise CommonError(
+            f"Failed to index {len(errors)} of {len(chunk_ids)} chunks, "
+            f"{added_vectors} were added"
+        )
 
-def clean_chunks_open_search(workspace_id: str, document_id: str):
+    return {"removed_vectors": removed_vectors, "added_vectors": added_vectors}
+
+
+# Chunks stored before content hashing are grouped under None
+def get_chunk_hashes_open_search(workspace_id: str, document_id: str) -> Dict:
     index_name = workspace_id.replace("-", "")
     client = get_open_search_client()
+    ret_value = {}
 
     query = {
+        "size": 1000,
+        "_source": ["content_hash"],
+        "sort": [{"chunk_id": "asc"}],
         "query": {
             "bool": {
                 "must": [
@@ -61,14 +126,100 @@ def clean_chunks_open_search(workspace_id: str, document_id: str):
                     {"term": {"document_id": document_id}},
                 ]
             }
-        }
+        },
     }
 
-    response = client.search(index=index_name, body=query)
-    docs = response["hits"]["hits"]
-    removed_vectors = len(docs)
+    while True:
+        response = client.search(index=index_name, body=query)
+        docs = response["hits"]["hits"]
+
+        for doc in docs:
+            content_hash = doc["_source"].get("content_hash")
+            ret_value.setdefault(content_hash, []).append(doc["_id"])
+
+        if len(docs) < query["size"]:
+            break
+
+        query["search_after"] = docs[-1]["sort"]
+
+    return ret_value
+
+
+def remove_chunks_open_search(workspace_id: str, ids: List[str]):
+    index_name = workspace_id.replace("-", "")
+    client = get_open_search_client()
+
+    return _delete_documents(client, index_name, ids)
+
+
+def clean_chunks_open_search(workspace_id: str, document_id: str):
+    index_name = workspace_id.replace("-", "")
+    client = get_open_search_client()
+
+    return delete_chunks_by_query(
+        client,
+        index_name,
+        {
+            "bool": {
+                "must": [
+                    {"term": {"workspace_id": workspace_id}},
+                    {"term": {"document_id": document_id}},
+                ]
+            }
+        },
+    )
+
+
+# Serverless collections do not support delete by query
+def delete_chunks_by_query(client, index_name: str, query: dict) -> int:
+    removed_vectors = 0
+    body = {
+        "size": OPEN_SEARCH_BULK_MAX_CHUNKS,
+        "_source": False,
+        "sort": [{"chunk_id": "asc"}],
+        "query": query,
+    }
+
+    while True:
+        response = client.search(index=index_name, body=body)
+        docs = response["hits"]["hits"]
+
+        removed_vectors += _delete_documents(
+            client, index_name, [doc["_id"] for doc in docs]
+        )
+
+        if len(docs) < body["size"]:
+            break
+
+        body["search_after"] = docs[-1]["sort"]
+
+    return removed_vectors
+
+
+def _delete_documents(client, index_name: str, ids: List[str]) -> int:
+    actions = ({"_op_type": "delete", "_index": index_name, "_id": id} for id in ids)
+
+    removed_vectors = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(
+        client,
+        actions,
+        chunk_size=OPEN_SEARCH_BULK_MAX_CHUNKS,
+        max_retries=OPEN_SEARCH_BULK_MAX_RETRIES,
+        raise_on_error=False,
+    ):
+        if ok and item["delete"].get("result") == "deleted":
+            removed_vectors += 1
+        elif not ok and item["delete"].get("status") != 404:
+            # Chunks already deleted are not counted
+            errors.append(item)
+
+    if errors:
+        for error in errors[:10]:
+            print(f"Failed to delete chunk: {error}")
 
-    for doc in docs:
-        client.delete(index=index_name, id=doc["_id"], ignore=[400, 404])
+        raise CommonError(
+            f"Failed to delete {len(errors)} chunks, {removed_vectors} were deleted"
+        )
 
     return removed_vectors
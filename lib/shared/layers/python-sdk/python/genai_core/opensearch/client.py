@@ -1,28 +1,46 @@
 import os
 import boto3
+import threading
 import urllib.parse
+from typing import Optional
 from opensearchpy import OpenSearch, RequestsHttpConnection
 from requests_aws4auth import AWS4Auth
 
 
 OPEN_SEARCH_COLLECTION_ENDPOINT = os.environ.get("OPEN_SEARCH_COLLECTION_ENDPOINT")
+# Keep-alive connections kept open to the collection, searches and bulk
+# requests from concurrent threads share them
+OPEN_SEARCH_POOL_SIZE = int(os.environ.get("OPEN_SEARCH_POOL_SIZE", 10))
 
 port = 443
 timeout = 300
 
+_client: Optional[OpenSearch] = None
+_client_lock = threading.Lock()
 
+
+# Lambda keeps the client between warm invocations, connections are reused
 def get_open_search_client():
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = create_open_search_client()
+
+        return _client
+
+
+def create_open_search_client():
     service = "aoss"
     session = boto3.Session()
-    credentials = session.get_credentials()
     host = urllib.parse.urlparse(OPEN_SEARCH_COLLECTION_ENDPOINT).hostname
 
+    # Every request is signed with the current credentials, botocore
+    # refreshes temporary credentials before the session token expires
     awsauth = AWS4Auth(
-        credentials.access_key,
-        credentials.secret_key,
-        session.region_name,
-        service,
-        session_token=credentials.token,
+        region=session.region_name,
+        service=service,
+        refreshable_credentials=session.get_credentials(),
     )
 
     opensearch = OpenSearch(
@@ -31,6 +49,7 @@ def get_open_search_client():
         use_ssl=True,
         verify_certs=True,
         connection_class=RequestsHttpConnection,
+        pool_maxsize=OPEN_SEARCH_POOL_SIZE,
         timeout=timeout,
     )
 
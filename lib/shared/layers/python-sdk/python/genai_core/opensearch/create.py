@@ -1,10 +1,12 @@
 from .client import get_open_search_client
+from genai_core.types import CommonError
 
 
 def create_workspace_index(workspace: dict):
     workspace_id = workspace["workspace_id"]
     index_name = workspace_id.replace("-", "")
     embeddings_model_dimensions = workspace["embeddings_model_dimensions"]
+    quantization = workspace.get("quantization", "none")
 
     client = get_open_search_client()
 
@@ -18,27 +20,25 @@ def create_workspace_index(workspace: dict):
         },
         "mappings": {
             "properties": {
-                "content_embeddings": {
-                    "type": "knn_vector",
-                    "dimension": int(embeddings_model_dimensions),
-                    "method": {
-                        "name": "hnsw",
-                        "space_type": "l2",
-                        "engine": "nmslib",
-                        "parameters": {"ef_construction": 512, "m": 16},
-                    },
-                },
+                "content_embeddings": _get_vector_mapping(
+                    embeddings_model_dimensions, quantization
+                ),
                 "chunk_id": {"type": "keyword"},
                 "workspace_id": {"type": "keyword"},
                 "document_id": {"type": "keyword"},
                 "document_sub_id": {"type": "keyword"},
                 "document_type": {"type": "keyword"},
                 "document_sub_type": {"type": "keyword"},
-                "path": {"type": "text"},
+                # The keyword field serves the path prefix filters
+                "path": {
+                    "type": "text",
+                    "fields": {"keyword": {"type": "keyword", "ignore_above": 1024}},
+                },
                 "language": {"type": "keyword"},
                 "title": {"type": "text"},
                 "content": {"type": "text"},
                 "content_complement": {"type": "text"},
+                "content_hash": {"type": "keyword"},
                 "metadata": {"type": "object"},
                 "created_at": {
                     "type": "date",
@@ -52,3 +52,42 @@ def create_workspace_index(workspace: dict):
 
     print("Created workspace index")
     print(response)
+
+
+def _get_vector_mapping(embeddings_model_dimensions: int, quantization: str):
+    hnsw_parameters = {"ef_construction": 512, "m": 16}
+    mapping = {
+        "type": "knn_vector",
+        "dimension": int(embeddings_model_dimensions),
+    }
+
+    if quantization == "none":
+        mapping["method"] = {
+            "name": "hnsw",
+            "space_type": "l2",
+            "engine": "nmslib",
+            "parameters": hnsw_parameters,
+        }
+    elif quantization == "float16":
+        # The source keeps the float vectors for reranking
+        mapping["method"] = {
+            "name": "hnsw",
+            "space_type": "l2",
+            "engine": "faiss",
+            "parameters": {
+                **hnsw_parameters,
+                "encoder": {"name": "sq", "parameters": {"type": "fp16"}},
+            },
+        }
+    elif quantization == "int8":
+        mapping["data_type"] = "byte"
+        mapping["method"] = {
+            "name": "hnsw",
+            "space_type": "l2",
+            "engine": "lucene",
+            "parameters": hnsw_parameters,
+        }
+    else:
+        raise CommonError("Unknown quantization")
+
+    return mapping
@@ -2,6 +2,7 @@ import os
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 from .client import get_open_search_client
+from .chunks import delete_chunks_by_query
 import genai_core.utils.delete_files_with_prefix
 import genai_core.utils.delete_files_with_object_key
 import genai_core.types
@@ -128,30 +129,14 @@ def delete_open_search_document(workspace_id: str, document: dict):
         print(f"An error occurred: {error}")
 
 
-
 def deleteOpenSearchDocument(document_id, index_name):
     client = get_open_search_client()
-    if client.indices.exists(index_name):
-        search_query = {
-            "query": {
-                "match": {
-                    "document_id": document_id
-                }
-            }
-        }
-        from_ = 0
-        batch_size = 100
-        while True:
-            search_response = client.search(
-                index=index_name, body=search_query, from_=from_, size=batch_size)
+    if not client.indices.exists(index_name):
+        return 0
 
-            hits = search_response['hits']['hits']
-            if not hits:
-                break
-
-            for hit in hits:
-                client.delete(index=index_name, id=hit['_id'])
-
-            from_ += batch_size
+    removed_vectors = delete_chunks_by_query(
+        client, index_name, {"term": {"document_id": document_id}}
+    )
+    print(f"Record {document_id} deleted, {removed_vectors} chunks removed.")
 
-        print(f"Record {document_id} deleted.")
+    return removed_vectors
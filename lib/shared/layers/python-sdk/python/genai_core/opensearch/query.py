@@ -1,9 +1,16 @@
 import genai_core.embeddings
+import genai_core.workspaces
 import genai_core.cross_encoder
-from typing import List
+from typing import List, Optional
 from .client import get_open_search_client
+from .utils import (
+    QUANTIZATION_OVERSAMPLING,
+    get_filter_clauses,
+    quantize_int8,
+    rerank_full_precision,
+)
 from aws_lambda_powertools import Logger
-from genai_core.types import CommonError, Task
+from genai_core.types import CommonError, SemanticSearchFilters, Task
 
 logger = Logger()
 
@@ -15,6 +22,8 @@ def query_workspace_open_search(
     limit: int,
     full_response: bool,
     threshold: float = 0.0,
+    vector_search_params: Optional[dict] = None,
+    filters: Optional[SemanticSearchFilters] = None,
 ):
     index_name = workspace_id.replace("-", "")
 
@@ -24,8 +33,21 @@ def query_workspace_open_search(
     cross_encoder_model_name = workspace["cross_encoder_model_name"]
     hybrid_search = workspace["hybrid_search"]
     languages = workspace["languages"]
-    vector_search_limit = 25
+    quantization = workspace.get("quantization", "none")
+    search_params = genai_core.workspaces.get_vector_search_params(
+        workspace, vector_search_params
+    )
+    vector_search_limit = search_params.k
+    ef_search = search_params.ef_search
     keyword_search_limit = 25
+    # Candidates are read without their content, which is only fetched
+    # for the reranked candidates and the returned items
+    two_phase = search_params.rerank_candidates is not None
+    source = True
+    if two_phase:
+        source = ["chunk_id"]
+        if quantization == "float16":
+            source.append("content_embeddings")
 
     vector_search_records = []
     keyword_search_records = []
@@ -45,22 +67,66 @@ def query_workspace_open_search(
         raise CommonError("Cross encoder model not found")
 
     query_embeddings = genai_core.embeddings.generate_embeddings(
-        selected_model, [query], Task.RETRIEVE
+        selected_model,
+        [query],
+        Task.RETRIEVE,
+        dimensions=workspace["embeddings_model_dimensions"],
     )[0]
 
     items = []
+    filter_clauses = get_filter_clauses(filters)
+    # Lucene and Faiss apply the filter during the k-NN search, NMSLIB
+    # results are filtered after it
+    efficient_filter = genai_core.workspaces.OPEN_SEARCH_QUANTIZATION_ENGINES.get(
+        quantization
+    ) in ["lucene", "faiss"]
 
     client = get_open_search_client()
-    vector_search_records = vector_query(
-        client, index_name, query_embeddings, vector_search_limit
-    )
+    if quantization == "int8":
+        vector_search_records = vector_query(
+            client,
+            index_name,
+            quantize_int8(query_embeddings),
+            vector_search_limit,
+            ef_search,
+            source,
+            filter_clauses,
+            efficient_filter,
+        )
+    elif quantization == "float16":
+        vector_search_records = vector_query(
+            client,
+            index_name,
+            query_embeddings,
+            vector_search_limit * QUANTIZATION_OVERSAMPLING,
+            ef_search,
+            source,
+            filter_clauses,
+            efficient_filter,
+        )
+        vector_search_records = rerank_full_precision(
+            vector_search_records, query_embeddings, vector_search_limit
+        )
+    else:
+        vector_search_records = vector_query(
+            client,
+            index_name,
+            query_embeddings,
+            vector_search_limit,
+            ef_search,
+            source,
+            filter_clauses,
+            efficient_filter,
+        )
+    document_ids = _get_document_ids(vector_search_records)
     vector_search_records = _convert_records("vector_search", vector_search_records)
     items.extend(vector_search_records)
 
     if hybrid_search:
         keyword_search_records = keyword_query(
-            client, index_name, query, keyword_search_limit
+            client, index_name, query, keyword_search_limit, source, filter_clauses
         )
+        document_ids.update(_get_document_ids(keyword_search_records))
 
         keyword_search_records = _convert_records(
             "keyword_search", keyword_search_records
@@ -96,6 +162,20 @@ def query_workspace_open_search(
                 item["keyword_search_score"] = current["keyword_search_score"]
 
     unique_items = list(unique_items.values())
+    if two_phase:
+        # Vector and keyword candidates are interleaved by rank, the
+        # candidates past rerank_candidates are not reranked
+        ranks = {}
+        for records in [vector_search_records, keyword_search_records]:
+            for rank, record in enumerate(records):
+                chunk_id = record["chunk_id"]
+                ranks[chunk_id] = min(rank, ranks.get(chunk_id, rank))
+
+        unique_items = sorted(unique_items, key=lambda x: ranks[x["chunk_id"]])
+        unique_items = unique_items[: search_params.rerank_candidates]
+        _hydrate_records(client, index_name, document_ids, unique_items, ["content"])
+        unique_items = [item for item in unique_items if item["content"] is not None]
+
     score_dict = dict({})
     if len(unique_items) > 0:
         passages = [record["content"] for record in unique_items]
@@ -110,12 +190,20 @@ def query_workspace_open_search(
     unique_items = sorted(unique_items, key=lambda x: x["score"], reverse=True)
 
     for record in vector_search_records:
-        record["score"] = score_dict[record["chunk_id"]]
+        record["score"] = score_dict.get(record["chunk_id"])
     for record in keyword_search_records:
-        record["score"] = score_dict[record["chunk_id"]]
+        record["score"] = score_dict.get(record["chunk_id"])
 
     if full_response:
         unique_items = unique_items[:limit]
+        if two_phase:
+            _hydrate_records(
+                client,
+                index_name,
+                document_ids,
+                unique_items + vector_search_records + keyword_search_records,
+            )
+
         ret_value = {
             "engine": "opensearch",
             "supported_languages": languages,
@@ -141,6 +229,9 @@ def query_workspace_open_search(
                 )[: (limit - len(ret_items))]
             )
 
+        if two_phase:
+            _hydrate_records(client, index_name, document_ids, ret_items)
+
         ret_value = {
             "engine": "opensearch",
             "supported_languages": languages,
@@ -190,8 +281,28 @@ def _convert_records(source: str, records: List[dict]):
     return converted_records
 
 
-def vector_query(client, index_name: str, vector: List[float], size: int = 25):
-    query = {"query": {"knn": {"content_embeddings": {"vector": vector, "k": 5}}}}
+def vector_query(
+    client,
+    index_name: str,
+    vector: List[float],
+    size: int = 25,
+    ef_search: Optional[int] = None,
+    source=True,
+    filter_clauses: Optional[List[dict]] = None,
+    efficient_filter: bool = False,
+):
+    knn = {"vector": vector, "k": size}
+    if ef_search:
+        # Overrides the ef_search index setting for this query
+        knn["method_parameters"] = {"ef_search": max(ef_search, size)}
+
+    knn_query = {"knn": {"content_embeddings": knn}}
+    if filter_clauses and efficient_filter:
+        knn["filter"] = {"bool": {"filter": filter_clauses}}
+    elif filter_clauses:
+        knn_query = {"bool": {"must": [knn_query], "filter": filter_clauses}}
+
+    query = {"query": knn_query, "_source": source}
 
     response = client.search(index=index_name, body=query, size=size)
 
@@ -201,12 +312,71 @@ def vector_query(client, index_name: str, vector: List[float], size: int = 25):
     return ret_value
 
 
-def keyword_query(client, index_name: str, text: str, size: int = 25):
-    query = {"query": {"match": {"content": text}}}
+def keyword_query(
+    client,
+    index_name: str,
+    text: str,
+    size: int = 25,
+    source=True,
+    filter_clauses: Optional[List[dict]] = None,
+):
+    match_query = {"match": {"content": text}}
+    if filter_clauses:
+        match_query = {"bool": {"must": [match_query], "filter": filter_clauses}}
+
+    query = {"query": match_query, "_source": source}
 
     response = client.search(index=index_name, body=query, size=size)
 
     ret_value = response["hits"]["hits"]
     ret_value = ret_value if ret_value is not None else []
 
-    return ret_value
\ No newline at end of file
+    return ret_value
+
+
+def _get_document_ids(records: List[dict]):
+    return {record["_source"].get("chunk_id"): record["_id"] for record in records}
+
+
+# Records retrieved without their fields are updated in place
+def _hydrate_records(
+    client,
+    index_name: str,
+    document_ids: dict,
+    records: List[dict],
+    fields: Optional[List[str]] = None,
+):
+    fields = fields or [
+        "workspace_id",
+        "document_id",
+        "document_sub_id",
+        "document_type",
+        "document_sub_type",
+        "path",
+        "language",
+        "title",
+        "content",
+        "content_complement",
+        "metadata",
+    ]
+
+    chunk_ids = list(dict.fromkeys(record["chunk_id"] for record in records))
+    if not chunk_ids:
+        return
+
+    response = client.mget(
+        index=index_name,
+        body={"ids": [document_ids[chunk_id] for chunk_id in chunk_ids]},
+        _source=fields,
+    )
+
+    documents = {
+        document["_id"]: document["_source"]
+        for document in response["docs"]
+        if document.get("found")
+    }
+
+    for record in records:
+        current = documents.get(document_ids[record["chunk_id"]])
+        if current is not None:
+            record.update({field: current.get(field) for field in fields})
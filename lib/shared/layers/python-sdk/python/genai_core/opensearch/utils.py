@@ -0,0 +1,65 @@
+import numpy as np
+from datetime import datetime, timezone
+from typing import List, Optional
+from genai_core.types import SemanticSearchFilters
+
+# Candidates read from the quantized index for every result kept after
+# reranking against the full precision vectors
+QUANTIZATION_OVERSAMPLING = 4
+
+
+def quantize_int8(vector) -> List[int]:
+    # Embeddings are normalized, so every component is within [-1, 1]
+    vector = np.asarray(vector, dtype=np.float32)
+    quantized = np.clip(np.rint(vector * 127), -128, 127).astype(np.int8)
+
+    return quantized.tolist()
+
+
+def rerank_full_precision(records: List[dict], vector, size: int):
+    """Rescores the candidates with the float vectors kept in the source"""
+    vector = np.asarray(vector, dtype=np.float32)
+    for record in records:
+        embeddings = record["_source"].get("content_embeddings")
+        if embeddings is None:
+            continue
+
+        distance = np.sum((np.asarray(embeddings, dtype=np.float32) - vector) ** 2)
+        # Same scoring as the l2 space of the k-NN plugin
+        record["_score"] = float(1 / (1 + distance))
+
+    records = sorted(records, key=lambda x: x["_score"], reverse=True)
+
+    return records[:size]
+
+
+def get_filter_clauses(filters: Optional[SemanticSearchFilters]) -> List[dict]:
+    """Returns the bool filter clauses matching the search filters"""
+    clauses = []
+    if filters is None:
+        return clauses
+
+    if filters.document_types:
+        clauses.append({"terms": {"document_type": filters.document_types}})
+    if filters.document_ids:
+        clauses.append({"terms": {"document_id": filters.document_ids}})
+    if filters.path_prefix:
+        clauses.append({"prefix": {"path.keyword": filters.path_prefix}})
+
+    created_at = {}
+    if filters.created_after:
+        created_at["gte"] = _get_epoch_millis(filters.created_after)
+    if filters.created_before:
+        created_at["lt"] = _get_epoch_millis(filters.created_before)
+    if created_at:
+        clauses.append({"range": {"created_at": created_at}})
+
+    return clauses
+
+
+def _get_epoch_millis(value: datetime) -> int:
+    # Chunks are indexed with UTC timestamps
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+
+    return int(value.timestamp() * 1000)
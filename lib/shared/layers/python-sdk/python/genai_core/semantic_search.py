@@ -1,13 +1,19 @@
 import genai_core.types
 import genai_core.workspaces
 import genai_core.embeddings
+from typing import Optional
 from genai_core.aurora import query_workspace_aurora
 from genai_core.opensearch import query_workspace_open_search
 from genai_core.kendra import query_workspace_kendra
 
 
 def semantic_search(
-    workspace_id: str, query: str, limit: int = 5, full_response: bool = False
+    workspace_id: str,
+    query: str,
+    limit: int = 5,
+    full_response: bool = False,
+    vector_search_params: Optional[dict] = None,
+    filters: Optional[dict] = None,
 ):
     workspace = genai_core.workspaces.get_workspace(workspace_id)
 
@@ -17,17 +23,39 @@ def semantic_search(
     if workspace["status"] != "ready":
         raise genai_core.types.CommonError("Workspace is not ready")
 
+    # Applied by the engine, so that every returned item matches them
+    search_filters = None
+    if filters:
+        search_filters = genai_core.types.SemanticSearchFilters(**filters)
+
     if workspace["engine"] == "aurora":
         return query_workspace_aurora(
-            workspace_id, workspace, query, limit, full_response
+            workspace_id,
+            workspace,
+            query,
+            limit,
+            full_response,
+            vector_search_params=vector_search_params,
+            filters=search_filters,
         )
     elif workspace["engine"] == "opensearch":
         return query_workspace_open_search(
-            workspace_id, workspace, query, limit, full_response
+            workspace_id,
+            workspace,
+            query,
+            limit,
+            full_response,
+            vector_search_params=vector_search_params,
+            filters=search_filters,
         )
     elif workspace["engine"] == "kendra":
         return query_workspace_kendra(
-            workspace_id, workspace, query, limit, full_response
+            workspace_id,
+            workspace,
+            query,
+            limit,
+            full_response,
+            filters=search_filters,
         )
 
     raise genai_core.types.CommonError(
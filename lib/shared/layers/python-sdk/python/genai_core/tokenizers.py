@@ -0,0 +1,52 @@
+import functools
+from typing import Callable
+from genai_core.types import Provider
+from genai_core.embeddings_batching import CHARS_PER_TOKEN
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+
+@functools.lru_cache(maxsize=16)
+def get_token_counter(provider: str, name: str) -> Callable[[str], int]:
+    """Returns a token counter for the embeddings model, or an estimate"""
+    if provider == Provider.OPENAI.value and tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(name)
+        except Exception as error:
+            print(f"Could not load the tiktoken encoding for {name}: {error}")
+        else:
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+    if provider == Provider.SAGEMAKER.value and Tokenizer is not None:
+        try:
+            tokenizer = Tokenizer.from_pretrained(name)
+        except Exception as error:
+            print(f"Could not load the tokenizer for {name}: {error}")
+        else:
+            return lambda text: len(
+                tokenizer.encode(text, add_special_tokens=False).ids
+            )
+
+    print(
+        f"No tokenizer for {provider}/{name}, token counts are estimated "
+        f"at {CHARS_PER_TOKEN} characters per token"
+    )
+
+    return _estimate_tokens
+
+
+def is_token_count_estimated(provider: str) -> bool:
+    # Only OpenAI and SageMaker models have a public tokenizer
+    return provider not in [Provider.OPENAI.value, Provider.SAGEMAKER.value]
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -1,5 +1,6 @@
 from enum import Enum
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -13,6 +14,7 @@ class EmbeddingsModel(BaseModel):
     name: str
     default: Optional[bool] = None
     dimensions: int
+    concurrency: Optional[int] = None
 
 
 class CrossEncoderModel(BaseModel):
@@ -21,6 +23,28 @@ class CrossEncoderModel(BaseModel):
     default: Optional[bool] = None
 
 
+class VectorSearchParams(BaseModel):
+    # Candidates read from the vector index
+    k: int = 25
+    # IVF lists scanned per query, pgvector only
+    probes: Optional[int] = None
+    # Size of the HNSW candidate list
+    ef_search: Optional[int] = None
+    # When set, candidates are retrieved without their content and only
+    # this many of them are read and sent to the cross encoder
+    rerank_candidates: Optional[int] = None
+
+
+class SemanticSearchFilters(BaseModel):
+    # Every filter that is set has to match
+    document_types: Optional[List[str]] = None
+    document_ids: Optional[List[str]] = None
+    path_prefix: Optional[str] = None
+    # created_after is inclusive, created_before exclusive
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+
 class Workspace(BaseModel):
     id: str
     name: str
@@ -4,7 +4,8 @@ import uuid
 import boto3
 import genai_core.embeddings
 from datetime import datetime
-from genai_core.types import Task
+from typing import Optional
+from genai_core.types import Task, VectorSearchParams
 
 dynamodb = boto3.resource("dynamodb")
 sfn_client = boto3.client("stepfunctions")
@@ -23,9 +24,22 @@ CREATE_KENDRA_WORKSPACE_WORKFLOW_ARN = os.environ.get(
     "CREATE_KENDRA_WORKSPACE_WORKFLOW_ARN"
 )
 DELETE_WORKSPACE_WORKFLOW_ARN = os.environ.get("DELETE_WORKSPACE_WORKFLOW_ARN")
+# Storage layout of new Aurora workspaces when none is requested
+AURORA_STORAGE_LAYOUT = os.environ.get("AURORA_STORAGE_LAYOUT", "table")
 
 WORKSPACE_OBJECT_TYPE = "workspace"
 
+AURORA_QUANTIZATIONS = ["none", "float16", "binary"]
+AURORA_INDEX_TYPES = ["ivfflat", "hnsw"]
+# A table per workspace, or a partition of a table shared by the
+# workspaces with the same embeddings dimensions
+AURORA_STORAGE_LAYOUTS = ["table", "partitioned"]
+OPEN_SEARCH_QUANTIZATION_ENGINES = {
+    "none": "nmslib",
+    "float16": "faiss",
+    "int8": "lucene",
+}
+
 if WORKSPACES_TABLE_NAME:
     table = dynamodb.Table(WORKSPACES_TABLE_NAME)
 
@@ -71,6 +85,18 @@ def get_workspace(workspace_id: str):
     return item
 
 
+def get_vector_search_params(
+    workspace: dict, vector_search_params: Optional[dict] = None
+) -> VectorSearchParams:
+    params = dict(workspace.get("vector_search_params") or {})
+    if vector_search_params:
+        params.update(
+            {key: value for key, value in vector_search_params.items() if value}
+        )
+
+    return VectorSearchParams(**{key: int(value) for key, value in params.items()})
+
+
 def set_status(workspace_id: str, status: str):
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
@@ -103,6 +129,12 @@ def create_workspace_aurora(
     chunking_strategy: str,
     chunk_size: int,
     chunk_overlap: int,
+    quantization: str = "none",
+    index_type: str = "ivfflat",
+    hnsw_m: Optional[int] = None,
+    hnsw_ef_construction: Optional[int] = None,
+    vector_search_params: Optional[dict] = None,
+    storage_layout: Optional[str] = None,
 ):
     workspace_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -113,7 +145,9 @@ def create_workspace_aurora(
     if not embeddings_model:
         raise genai_core.types.CommonError("Invalid embeddings model")
     # Verify that the embeddings model
-    genai_core.embeddings.generate_embeddings(embeddings_model, ["test"], Task.STORE)
+    genai_core.embeddings.generate_embeddings(
+        embeddings_model, ["test"], Task.STORE, use_cache=False
+    )
 
     item = {
         "workspace_id": workspace_id,
@@ -134,6 +168,12 @@ def create_workspace_aurora(
         "chunking_strategy": chunking_strategy,
         "chunk_size": chunk_size,
         "chunk_overlap": chunk_overlap,
+        "quantization": quantization,
+        "index_type": index_type,
+        "hnsw_m": hnsw_m,
+        "hnsw_ef_construction": hnsw_ef_construction,
+        "vector_search_params": vector_search_params or {},
+        "storage_layout": storage_layout or AURORA_STORAGE_LAYOUT,
         "documents": 0,
         "vectors": 0,
         "size_in_bytes": 0,
@@ -170,6 +210,8 @@ def create_workspace_open_search(
     chunking_strategy: str,
     chunk_size: int,
     chunk_overlap: int,
+    quantization: str = "none",
+    vector_search_params: Optional[dict] = None,
 ):
     workspace_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -180,7 +222,9 @@ def create_workspace_open_search(
     if not embeddings_model:
         raise genai_core.types.CommonError("Invalid embeddings model")
     # Verify that the embeddings model
-    genai_core.embeddings.generate_embeddings(embeddings_model, ["test"], Task.STORE)
+    genai_core.embeddings.generate_embeddings(
+        embeddings_model, ["test"], Task.STORE, use_cache=False
+    )
 
     item = {
         "workspace_id": workspace_id,
@@ -196,11 +240,13 @@ def create_workspace_open_search(
         "cross_encoder_model_name": cross_encoder_model_name,
         "languages": languages,
         "metric": "l2",
-        "aoss_engine": "nmslib",
+        "aoss_engine": OPEN_SEARCH_QUANTIZATION_ENGINES[quantization],
         "hybrid_search": hybrid_search,
         "chunking_strategy": chunking_strategy,
         "chunk_size": chunk_size,
         "chunk_overlap": chunk_overlap,
+        "quantization": quantization,
+        "vector_search_params": vector_search_params or {},
         "documents": 0,
         "vectors": 0,
         "size_in_bytes": 0,
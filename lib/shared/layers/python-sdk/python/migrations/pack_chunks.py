@@ -0,0 +1,45 @@
+"""
+Packs the chunks that workspaces stored on S3 as one object per chunk
+into the JSON Lines packs written by genai_core.chunks.store_chunks_on_s3.
+
+Run it with credentials for the deployment, the bucket and table names
+are the ones set on the API handler function:
+
+    cd lib/shared/layers/python-sdk/python
+    PROCESSING_BUCKET_NAME=... WORKSPACES_TABLE_NAME=... \\
+        python -m migrations.pack_chunks --all
+"""
+
+import argparse
+import genai_core.chunks
+import genai_core.workspaces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack chunks stored on S3")
+    parser.add_argument("--workspace-id", action="append", default=[])
+    parser.add_argument("--document-id", help="Only pack the chunks of a document")
+    parser.add_argument("--all", action="store_true", help="Pack every workspace")
+    args = parser.parse_args()
+
+    if args.document_id and len(args.workspace_id) != 1:
+        parser.error("--document-id requires a single --workspace-id")
+
+    workspace_ids = args.workspace_id
+    if args.all:
+        workspace_ids = [
+            workspace["workspace_id"]
+            for workspace in genai_core.workspaces.list_workspaces()
+        ]
+    if not workspace_ids:
+        parser.error("--workspace-id or --all is required")
+
+    for workspace_id in workspace_ids:
+        migrated = genai_core.chunks.migrate_chunks_on_s3(
+            workspace_id, args.document_id
+        )
+        print(f"Workspace {workspace_id}: {migrated} chunks packed")
+
+
+if __name__ == "__main__":
+    main()
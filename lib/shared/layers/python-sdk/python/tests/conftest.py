@@ -0,0 +1,5 @@
+import os
+import sys
+
+# genai_core is deployed as a Lambda layer, tests import it from the layer
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
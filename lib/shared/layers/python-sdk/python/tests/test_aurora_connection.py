@@ -0,0 +1,130 @@
+import os
+import json
+import socket
+import psycopg2
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import genai_core.aurora.connection as connection  # noqa: E402
+
+
+class FakeCursor(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def execute(self, query, params=None):
+        if self.conn.lost:
+            raise psycopg2.OperationalError("server closed the connection")
+        # psycopg2 opens a transaction on the first query unless autocommit
+        if not self.conn._autocommit:
+            self.conn.in_transaction = True
+        self.description = [("vector", 16385)]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self._autocommit = False
+        self.in_transaction = False
+        self.closed = 0
+        self.lost = False
+        # The server end of the socket, closed when the connection is lost
+        self.server, self.client = socket.socketpair()
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.in_transaction:
+            raise psycopg2.ProgrammingError(
+                "set_session cannot be used inside a transaction"
+            )
+        self._autocommit = value
+
+    def cursor(self):
+        if self.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        return FakeCursor(self)
+
+    def fileno(self):
+        return self.client.fileno()
+
+    def lose(self):
+        self.lost = True
+        self.server.close()
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+        self.server.close()
+        self.client.close()
+
+
+class FakeSecretsManager(object):
+    def get_secret_value(self, SecretId):
+        secret = {"host": "localhost", "username": "u", "password": "p", "port": 5432}
+
+        return {"SecretString": json.dumps(secret)}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    connections = []
+
+    def connect(**kwargs):
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(connection.psycopg2, "connect", connect)
+    monkeypatch.setattr(connection, "secretsmanager_client", FakeSecretsManager())
+    monkeypatch.setattr(connection, "pool", connection.AuroraConnectionPool())
+
+    yield connections
+
+    connection.pool.clear()
+
+
+@pytest.mark.parametrize("autocommit", [True, False])
+def test_new_connection_sets_autocommit(pool, autocommit):
+    with connection.AuroraConnection(autocommit=autocommit) as cursor:
+        assert cursor.conn.autocommit == autocommit
+
+    assert len(pool) == 1
+
+
+def test_connection_is_reused(pool):
+    with connection.AuroraConnection(autocommit=False) as cursor:
+        cursor.execute("SELECT 1;")
+
+    with connection.AuroraConnection() as cursor:
+        assert cursor.conn.autocommit
+
+    assert len(pool) == 1
+
+
+def test_connection_lost_while_idle_is_replaced(pool):
+    with connection.AuroraConnection() as cursor:
+        cursor.execute("SELECT 1;")
+    pool[0].lose()
+
+    with connection.AuroraConnection() as cursor:
+        cursor.execute("SELECT 1;")
+
+    assert len(pool) == 2
+    assert pool[0].closed
+    assert cursor.conn is pool[1]
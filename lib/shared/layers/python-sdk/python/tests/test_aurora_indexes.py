@@ -0,0 +1,105 @@
+import os
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import genai_core.aurora.indexes as indexes  # noqa: E402
+
+WORKSPACE = {
+    "workspace_id": "0a1b-2c3d",
+    "has_index": True,
+    "index_type": "ivfflat",
+    "metric": "cosine",
+    "embeddings_model_dimensions": 3,
+}
+
+
+class FakeCursor(object):
+    def __init__(self, locked=True, index=None, valid_indexes=None, rows=0):
+        self.locked = locked
+        self.index = index
+        self.valid_indexes = valid_indexes or {}
+        self.rows = rows
+        self.queries = []
+        self.result = None
+
+    def execute(self, query, params=None):
+        if not isinstance(query, str):
+            query = repr(query)
+        self.queries.append(query)
+
+        if "pg_try_advisory_lock" in query:
+            self.result = (self.locked,)
+        elif "pg_get_indexdef" in query:
+            self.result = self.index
+        elif "indisvalid FROM pg_index" in query:
+            valid = self.valid_indexes.get(params[0])
+            self.result = None if valid is None else (valid,)
+        elif "reltuples" in query:
+            self.result = (self.rows,)
+        else:
+            self.result = None
+
+    def fetchone(self):
+        return self.result
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    cursors = []
+
+    class FakeConnection(object):
+        def __init__(self, autocommit=True):
+            pass
+
+        def __enter__(self):
+            return cursors[0]
+
+        def __exit__(self, *args):
+            pass
+
+    monkeypatch.setattr(indexes, "AuroraConnection", FakeConnection)
+
+    return cursors
+
+
+def test_index_build_skipped_while_locked(cursor):
+    cursor.append(FakeCursor(locked=False))
+
+    assert indexes.ensure_workspace_index(WORKSPACE) is None
+    assert not any("CREATE INDEX" in query for query in cursor[0].queries)
+    assert not any("pg_advisory_unlock" in query for query in cursor[0].queries)
+
+
+def test_index_build_deferred_below_min_rows(cursor):
+    cursor.append(FakeCursor(rows=-1))
+
+    assert indexes.ensure_workspace_index(WORKSPACE) is None
+    assert not any("count(*)" in query for query in cursor[0].queries)
+    assert "pg_advisory_unlock" in cursor[0].queries[-1]
+
+
+def test_valid_index_is_not_dropped():
+    cursor = FakeCursor(valid_indexes={"0a1b2c3d_ivfflat_20": True})
+
+    index_name = indexes.create_vector_index(cursor, WORKSPACE, lists=20)
+
+    assert index_name == "0a1b2c3d_ivfflat_20"
+    assert not any("DROP INDEX" in query for query in cursor.queries)
+    assert not any("CREATE INDEX" in query for query in cursor.queries)
+
+
+def test_invalid_index_is_rebuilt(cursor):
+    lists = indexes.get_ivfflat_lists(indexes.AURORA_IVFFLAT_MIN_ROWS)
+    index_name = f"0a1b2c3d_ivfflat_{lists}"
+    cursor.append(
+        FakeCursor(
+            index=(index_name, f"CREATE INDEX ... WITH (lists='{lists}')", False),
+            valid_indexes={index_name: False},
+            rows=indexes.AURORA_IVFFLAT_MIN_ROWS,
+        )
+    )
+
+    assert indexes.ensure_workspace_index(WORKSPACE) == index_name
+    assert any("DROP INDEX" in query for query in cursor[0].queries)
+    assert any("CREATE INDEX" in query for query in cursor[0].queries)
@@ -0,0 +1,170 @@
+import os
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("DOCUMENTS_TABLE_NAME", "documents")
+
+import genai_core.chunks as chunks  # noqa: E402
+
+WORKSPACE = {
+    "workspace_id": "workspace",
+    "engine": "aurora",
+    "embeddings_model_provider": "provider",
+    "embeddings_model_name": "model",
+    "embeddings_model_dimensions": 1,
+}
+DOCUMENT = {"document_id": "document", "path": "path"}
+
+
+@pytest.fixture
+def document_vectors(monkeypatch):
+    calls = []
+
+    monkeypatch.setattr(
+        chunks.genai_core.embeddings, "get_embeddings_model", lambda *args: object()
+    )
+    monkeypatch.setattr(
+        chunks.genai_core.embeddings,
+        "generate_embeddings",
+        lambda model, texts, *args, **kwargs: [[0.0]] * len(texts),
+    )
+    monkeypatch.setattr(chunks, "store_chunks_on_s3", lambda *args: None)
+    monkeypatch.setattr(
+        chunks,
+        "_add_chunks_to_engine",
+        lambda **kwargs: {"added_vectors": len(kwargs["chunks"])},
+    )
+    monkeypatch.setattr(chunks, "remove_chunks", lambda *args: None)
+    monkeypatch.setattr(chunks, "remove_chunks_from_s3", lambda *args: None)
+    monkeypatch.setattr(
+        chunks.genai_core.documents,
+        "set_document_vectors",
+        lambda workspace_id, document_id, vectors, replace: calls.append(
+            (vectors, replace)
+        ),
+    )
+
+    return calls
+
+
+def test_stream_counts_kept_chunks_in_every_window(monkeypatch, document_vectors):
+    texts = [f"chunk {idx}" for idx in range(10)]
+    stored = {chunks.get_chunk_hash(text): ["id"] for text in texts[:8]}
+    monkeypatch.setattr(chunks, "get_chunk_hashes", lambda *args: stored)
+
+    chunks.add_chunks_stream(
+        True, WORKSPACE, DOCUMENT, None, iter(texts), window_size=4
+    )
+
+    assert document_vectors == [(4, True), (4, False), (2, False)]
+    assert sum(vectors for vectors, _ in document_vectors) == len(texts)
+
+
+class FakeBody(object):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class FakeObject(object):
+    def __init__(self, objects, key):
+        self.objects = objects
+        self.key = key
+
+    def put(self, Body, **kwargs):
+        self.objects[self.key] = Body.encode("utf-8") if isinstance(Body, str) else Body
+
+    def get(self, Range=None):
+        data = self.objects[self.key]
+        if Range:
+            start, end = Range[len("bytes=") :].split("-")
+            data = data[int(start) : int(end) + 1]
+
+        return {"Body": FakeBody(data)}
+
+
+class FakeBucket(object):
+    def __init__(self, objects):
+        self.objects = self
+        self.store = objects
+
+    def filter(self, Prefix):
+        return [
+            FakeObject(self.store, key)
+            for key in sorted(self.store)
+            if key.startswith(Prefix)
+        ]
+
+    def delete_objects(self, Delete):
+        for item in Delete["Objects"]:
+            del self.store[item["Key"]]
+
+
+class FakeS3(object):
+    def __init__(self):
+        self.store = {}
+
+    def Object(self, bucket, key):
+        return FakeObject(self.store, key)
+
+    def Bucket(self, bucket):
+        return FakeBucket(self.store)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(chunks, "s3", fake)
+    monkeypatch.setattr(
+        chunks.genai_core.utils.files,
+        "file_exists",
+        lambda bucket, key: key in fake.store,
+    )
+
+    return fake
+
+
+def test_stream_stores_one_pack_per_window(monkeypatch, document_vectors):
+    packs = []
+    monkeypatch.setattr(
+        chunks, "store_chunks_on_s3", lambda *args: packs.append(args[-1])
+    )
+    texts = [f"chunk {idx}" for idx in range(10)]
+
+    chunks.add_chunks_stream(
+        False, WORKSPACE, DOCUMENT, None, iter(texts), window_size=4
+    )
+
+    assert packs == [texts[0:4], texts[4:8], texts[8:10]]
+
+
+def test_migrate_packs_legacy_chunks(s3):
+    prefix = "workspace/document/chunks/"
+    for idx in range(3):
+        s3.Object("bucket", f"{prefix}id{idx}.txt").put(Body=f"chunk {idx}")
+
+    assert chunks.migrate_chunks_on_s3("workspace") == 3
+    assert not any(key.endswith(".txt") for key in s3.store)
+    assert chunks.read_chunks_from_s3(
+        "workspace", "document", None, ["id0", "id2"]
+    ) == {"id0": "chunk 0", "id2": "chunk 2"}
+    assert chunks.migrate_chunks_on_s3("workspace") == 0
+
+
+def test_remove_chunks_deletes_dead_packs(s3):
+    chunks.store_chunks_on_s3("workspace", "document", None, ["id0", "id1"], ["a", "b"])
+    chunks.store_chunks_on_s3(
+        "workspace", "document", "sub", ["id2", "id3"], ["c", "d"]
+    )
+    s3.Object("bucket", "workspace/document/chunks/id4.txt").put(Body="e")
+
+    removed = ["id0", "id1", "id2", "id4"]
+
+    # The pack of id0 and id1 with its index and the legacy id4
+    assert chunks.remove_chunks_from_s3("workspace", "document", removed) == 3
+    assert len(s3.store) == 2
+    assert chunks.read_chunks_from_s3(
+        "workspace", "document", "sub", ["id2", "id3"]
+    ) == {"id2": "c", "id3": "d"}
@@ -0,0 +1,65 @@
+import os
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import genai_core.embeddings as embeddings  # noqa: E402
+from genai_core.embeddings_batching import (  # noqa: E402
+    CHARS_PER_TOKEN,
+    get_max_chunk_tokens,
+)
+from genai_core.types import EmbeddingsModel  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "provider,name",
+    [
+        ("sagemaker", "intfloat/multilingual-e5-large"),
+        ("openai", "text-embedding-ada-002"),
+        ("bedrock", "amazon.titan-embed-text-v1"),
+        ("bedrock", "cohere.embed-english-v3"),
+        ("bedrock", "other.embed-text-v1"),
+    ],
+)
+def test_max_size_token_chunk_is_not_truncated(monkeypatch, provider, name):
+    model = EmbeddingsModel(provider=provider, name=name, dimensions=2)
+    chunk = "x" * (get_max_chunk_tokens(model) * CHARS_PER_TOKEN)
+    received = []
+
+    async def run_batch(model, input, *args):
+        received.extend(input)
+        return [[1.0, 0.0]] * len(input)
+
+    for function in ["openai", "bedrock", "sagemaker"]:
+        monkeypatch.setattr(embeddings, f"_agenerate_embeddings_{function}", run_batch)
+    monkeypatch.setattr(embeddings.genai_core.clients, "get_bedrock_client", object)
+
+    embeddings.generate_embeddings(model, [chunk], use_cache=False)
+
+    assert received == [chunk]
+
+
+def test_bedrock_client_is_shared_across_batches(monkeypatch):
+    model = EmbeddingsModel(
+        provider="bedrock", name="cohere.embed-english-v3", dimensions=2
+    )
+    clients = []
+    clients_used = set()
+
+    async def run_batch(model, input, task, bedrock, semaphore):
+        clients_used.add(bedrock)
+        return [[1.0, 0.0]] * len(input)
+
+    monkeypatch.setattr(embeddings, "_agenerate_embeddings_bedrock", run_batch)
+    monkeypatch.setattr(
+        embeddings.genai_core.clients,
+        "get_bedrock_client",
+        lambda: clients.append(object()) or clients[-1],
+    )
+
+    embeddings.generate_embeddings(
+        model, ["a", "b", "c"], batch_size=1, use_cache=False
+    )
+
+    assert len(clients) == 1
+    assert clients_used == set(clients)
@@ -149,6 +149,7 @@ export interface SystemConfig {
       name: string;
       dimensions: number;
       default?: boolean;
+      concurrency?: number;
     }[];
     crossEncoderModels: {
       provider: ModelProvider;
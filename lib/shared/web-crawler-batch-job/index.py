@@ -3,6 +3,7 @@ import json
 import boto3
 import genai_core.utils.json
 import genai_core.websites.crawler
+import genai_core.aurora.indexes
 
 PROCESSING_BUCKET_NAME = os.environ["INPUT_BUCKET_NAME"]
 WORKSPACE_ID = os.environ["WORKSPACE_ID"]
@@ -25,7 +26,7 @@ def main():
     limit = data["limit"]
     content_types = data["content_types"]
 
-    return genai_core.websites.crawler.crawl_urls(
+    result = genai_core.websites.crawler.crawl_urls(
         workspace=workspace,
         document=document,
         priority_queue=priority_queue,
@@ -35,5 +36,15 @@ def main():
         content_types=content_types,
     )
 
+    if workspace["engine"] == "aurora":
+        # The crawled pages are imported, a failed index build is retried
+        # by the next import of the workspace
+        try:
+            genai_core.aurora.indexes.ensure_workspace_index(workspace)
+        except Exception as error:
+            print(f"Vector index build failed: {error}")
+
+    return result
+
 if __name__ == "__main__":
     main()
\ No newline at end of file